@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+# serve the proguide apis with async views, see proguide.async_views
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'app.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,14 @@
+"""
+URL configuration used when serving through ASGI (app/asgi.py).
+
+the same routes as app.urls, with the proguide, tag and ingredient
+endpoints served by async views (see proguide.async_views).
+"""
+from app.urls import urlpatterns as sync_urlpatterns
+from proguide.async_views import async_urlpatterns
+
+urlpatterns = [
+    async_urlpatterns([pattern])[0]
+    if getattr(pattern, 'namespace', None) == 'proguide' else pattern
+    for pattern in sync_urlpatterns
+]
@@ -0,0 +1,130 @@
+"""
+precomputed OpenAPI schema.
+
+introspecting every view and serializer takes hundreds of milliseconds,
+so the schema is generated once per deploy: by the `generate_schema`
+command (scripts/run.sh), by the pre-fork warm-up, or else on the first
+request. it is kept rendered in every format, gzipped and with its ETag,
+and /api/schema/ only picks the bytes to send.
+
+the files (SCHEMA_CACHE_DIR) only let several workers or servers share
+one generation, the schema is built in memory when there are none.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import translation
+from django.utils.cache import (
+    get_conditional_response,
+    patch_vary_headers,
+    quote_etag,
+)
+
+from drf_spectacular.settings import patched_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+accepts_gzip = re.compile(r'\bgzip\b')
+
+_schema = None
+_lock = threading.Lock()
+
+
+def _entry(body):
+    digest = hashlib.sha1(body).hexdigest()
+    return {
+        'body': body,
+        'gzip': gzip.compress(body, mtime=0),
+        'etag': quote_etag(digest),
+        # strong ETags name the bytes sent, the gzipped ones are others
+        'gzip_etag': quote_etag(f'{digest}-gzip'),
+    }
+
+
+def build():
+    """generate the schema, return {format: entry} for every renderer"""
+    view = SpectacularAPIView()
+    # the same output whichever request or process builds it
+    with patched_settings(view.custom_settings), \
+            translation.override(settings.LANGUAGE_CODE):
+        schema = view.generator_class(
+            urlconf=view.urlconf, api_version=view.api_version,
+            patterns=view.patterns,
+        ).get_schema(request=None, public=view.serve_public)
+        return {
+            renderer.format: _entry(
+                renderer.render(schema, renderer_context={}))
+            for renderer in (cls() for cls in view.renderer_classes)
+        }
+
+
+def write(schema, directory):
+    """store the rendered schema as files, one per format"""
+    os.makedirs(directory, exist_ok=True)
+    for schema_format, entry in schema.items():
+        path = os.path.join(directory, f'schema.{schema_format}')
+        # write then rename, readers never see a partial file
+        with open(f'{path}.tmp', 'wb') as schema_file:
+            schema_file.write(entry['body'])
+        os.replace(f'{path}.tmp', path)
+
+
+def read(directory):
+    """return the stored schema, None unless every format is there"""
+    schema = {}
+    for cls in SpectacularAPIView.renderer_classes:
+        path = os.path.join(directory, f'schema.{cls.format}')
+        try:
+            with open(path, 'rb') as schema_file:
+                schema[cls.format] = _entry(schema_file.read())
+        except FileNotFoundError:
+            return None
+    return schema
+
+
+def get_schema():
+    """return the schema of this process, loading or building it once"""
+    global _schema
+    if _schema is None:
+        with _lock:
+            if _schema is None:
+                directory = settings.SCHEMA_CACHE_DIR
+                _schema = (directory and read(directory)) or build()
+    return _schema
+
+
+def set_schema(schema):
+    """replace the schema served by this process (None to reload)"""
+    global _schema
+    _schema = schema
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """serve the precomputed schema with an ETag, gzipped when accepted"""
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if request.GET.get('lang') or request.GET.get('version'):
+            # translated or versioned schemas are generated on demand
+            return super().get(request, *args, **kwargs)
+
+        entry = get_schema()[request.accepted_renderer.format]
+        gzipped = accepts_gzip.search(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = entry['gzip_etag'] if gzipped else entry['etag']
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            if gzipped:
+                response = HttpResponse(entry['gzip'])
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(entry['body'])
+            response['Content-Type'] = request.accepted_renderer.media_type
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
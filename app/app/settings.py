@@ -55,16 +55,21 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, its total covers the other middleware
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.QueryInspectionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'app.urls'
+# app/asgi.py switches to app.asgi_urls (async read views)
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'app.urls')
 
 TEMPLATES = [
     {
@@ -91,13 +96,47 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # configur in docker-compose
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # seconds a worker thread keeps its connection open between
+        # requests, 0 under ASGI (see scripts/run_asgi.sh)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # check a kept connection still works before reusing it
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))),
+        # connections shared by the threads of a worker, 0 disables it
+        # (core.backends.postgresql)
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', 0)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_AGE': int(os.environ.get('DB_POOL_MAX_AGE', 3600)),
+        },
     }
 }
+
+# optional read replica of the primary, safe proguide, tag and ingredient
+# requests read from it (core.routers, proguide.replica)
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST'),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get(
+            'DB_REPLICA_PASS', DATABASES['default']['PASSWORD']),
+        # tests read the test database through this alias
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# seconds a user's reads stay on the primary after they wrote, longer
+# than the replication lag
+DB_REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.mysql',
@@ -110,6 +149,24 @@ DATABASES = {
 # }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# locmem is per process, point this at a shared backend (redis/memcached)
+# when running several workers so cache invalidation reaches all of them
+# (docker-compose-deploy.yml uses redis); with locmem the proguide response
+# cache, list ETags and facet cache are off (proguide.cache)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -150,6 +207,19 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# stream every upload to a temporary file in chunks instead of memory
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# proguide image uploads, checked from the image header before decoding
+PROGUIDE_IMAGE_LIMITS = {
+    # same as client_max_body_size in the proxy
+    'MAX_BYTES': int(os.environ.get('PROGUIDE_IMAGE_MAX_BYTES', 10485760)),
+    'MAX_PIXELS': int(os.environ.get('PROGUIDE_IMAGE_MAX_PIXELS', 25000000)),
+    'FORMATS': ['JPEG', 'PNG', 'WEBP'],
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -163,6 +233,62 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# token -> user cache used by user.authentication.CachedTokenAuthentication
+# SHARED_CACHE is an optional CACHES alias shared by all workers, without it
+# other workers see a revoked token for up to TTL seconds: keep that short
+TOKEN_AUTH_SHARED_CACHE = os.environ.get('TOKEN_AUTH_SHARED_CACHE') or None
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 1024)),
+    'TTL': int(os.environ.get('TOKEN_AUTH_CACHE_TTL',
+                              60 if TOKEN_AUTH_SHARED_CACHE else 5)),
+    'SHARED_CACHE': TOKEN_AUTH_SHARED_CACHE,
+}
+
+# per-user versioned response cache for proguide list endpoints, off
+# while ALIAS is a per-process locmem cache unless LOCAL (one process only)
+PROGUIDE_CACHE = {
+    'ALIAS': os.environ.get('PROGUIDE_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('PROGUIDE_CACHE_TIMEOUT', 300)),
+    'LOCAL': bool(int(os.environ.get('PROGUIDE_CACHE_LOCAL', 0))),
+}
+
+# warm up app.wsgi before uwsgi forks the workers (app.warmup), turned on
+# by scripts/run.sh only: runserver and its autoreloader import app.wsgi too
+WSGI_WARMUP = bool(int(os.environ.get('WSGI_WARMUP', 0)))
+
+# threads serving async reads per ASGI worker (proguide.async_views),
+# each one may hold a database connection
+ASGI_READ_THREADS = int(os.environ.get('ASGI_READ_THREADS', 32))
+
+# directory of the schema files written by `generate_schema` (app.schema),
+# empty: every process builds the schema in memory once
+SCHEMA_CACHE_DIR = os.environ.get('SCHEMA_CACHE_DIR', '')
+
+# per-route request metrics (core.metrics), DIR shared by the workers of
+# a server to sum their metrics, empty: metrics of the serving process
+METRICS = {
+    'DIR': os.environ.get('METRICS_DIR', ''),
+    'FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL', 1)),
+}
+
+# log slow and repeated (N+1) queries of a sample of the requests
+# (core.queries), off unless QUERY_INSPECTION=1
+QUERY_INSPECTION = {
+    'ENABLED': bool(int(os.environ.get('QUERY_INSPECTION', 0))),
+    'SAMPLE_RATE': float(os.environ.get('QUERY_INSPECTION_SAMPLE_RATE', 0.05)),
+    'SLOW_MS': float(os.environ.get('QUERY_INSPECTION_SLOW_MS', 100)),
+    'REPEAT_THRESHOLD': int(os.environ.get('QUERY_INSPECTION_REPEATS', 5)),
+}
+
+# `?profile=1` / `?profile=stacks` reports for staff users (core.profiling)
+PROFILING = {
+    'ENABLED': bool(int(os.environ.get('PROFILING', 1))),
+    # seconds between two stack samples
+    'INTERVAL': float(os.environ.get('PROFILING_INTERVAL', 0.001)),
+    # functions listed in the cProfile report
+    'LIMIT': int(os.environ.get('PROFILING_LIMIT', 40)),
+}
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
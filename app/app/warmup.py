@@ -0,0 +1,56 @@
+"""
+pre-fork warm-up of the WSGI application.
+
+uwsgi imports app.wsgi once in the master and forks the workers from it
+(no --lazy-apps), so whatever is built here is shared copy-on-write by
+every worker instead of being built again by each of them on its first
+request.
+"""
+import gc
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from django.utils import translation
+
+from PIL import Image
+
+from app import schema
+from core.backends.postgresql.base import close_pools
+
+logger = logging.getLogger(__name__)
+
+
+def _populate(resolver):
+    """build the reverse lookup tables of a resolver and its children"""
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            _populate(pattern)
+
+
+def warm_up():
+    """import and build everything requests would otherwise do lazily"""
+    start = time.perf_counter()
+    # imports every urls and views module, then fills the lookup tables
+    _populate(get_resolver())
+    # walks every view and instantiates its serializers (field maps,
+    # model meta caches, lazy imports) on the way, and the workers get
+    # the rendered /api/schema/ responses
+    schema.set_schema(schema.build())
+    # pillow registers its format plugins on first open otherwise
+    Image.init()
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('')
+
+    # forked workers must never share the master's database sockets
+    connections.close_all()
+    close_pools()
+    # move everything alive to a permanent generation: the collector no
+    # longer writes to (and so copies) these shared pages in the workers
+    gc.collect()
+    gc.freeze()
+    logger.info('warm-up done in %.2fs, %d objects frozen',
+                time.perf_counter() - start, gc.get_freeze_count())
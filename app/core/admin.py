@@ -5,7 +5,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
 
-from core.models import User, ProGuide, Tag, Ingredient
+from core.models import User, ProGuide, ProGuideImageJob, Tag, Ingredient
 
 
 class UserAdmin(UserAdmin):
@@ -56,3 +56,4 @@ admin.site.register(User, UserAdmin)
 admin.site.register(ProGuide,)
 admin.site.register(Tag,)
 admin.site.register(Ingredient,)
+admin.site.register(ProGuideImageJob,)
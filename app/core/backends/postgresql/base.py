@@ -0,0 +1,133 @@
+"""
+postgresql backend with connection health checks and an in-process pool.
+
+settings, next to the usual ones of the database:
+- CONN_HEALTH_CHECKS: check a persistent connection with `SELECT 1`
+  before its first query in a request, reconnect if it is gone (what
+  django 4.1 adds, this is django 4.0).
+- POOL: {'MAX_SIZE', 'TIMEOUT', 'MAX_AGE'}, a pool shared by the threads
+  of the process. closing a connection (end of a request past
+  CONN_MAX_AGE, or of an async read) gives it back to the pool instead,
+  and opening one takes an idle one. at most MAX_SIZE connections are
+  open, a thread waits up to TIMEOUT seconds for one of them; MAX_SIZE 0
+  disables the pool.
+"""
+import functools
+import threading
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from core.backends.postgresql.pool import ConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_dict, conn_params):
+    """return the pool of a database, None if pooling is disabled"""
+    options = settings_dict.get('POOL') or {}
+    if not options.get('MAX_SIZE'):
+        return None
+    # the test runner points an alias at another database
+    key = tuple(sorted((name, str(value))
+                       for name, value in conn_params.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                max_size=options['MAX_SIZE'],
+                timeout=options.get('TIMEOUT', 10),
+                max_age=options.get('MAX_AGE', 3600),
+            )
+        return _pools[key]
+
+
+def close_pools():
+    """close the idle connections of every pool (before a fork)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+
+
+def is_usable(connection):
+    """check a raw connection with a query, leaving it idle"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        status = connection.info.transaction_status
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """test databases, idle pooled connections would block their drop"""
+
+    def _clone_test_db(self, *args, **kwargs):
+        close_pools()
+        return super()._clone_test_db(*args, **kwargs)
+
+    def _destroy_test_db(self, *args, **kwargs):
+        close_pools()
+        return super()._destroy_test_db(*args, **kwargs)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """postgresql connection with health checks and pooling"""
+
+    creation_class = DatabaseCreation
+
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        self.health_check_enabled = settings_dict.get(
+            'CONN_HEALTH_CHECKS', False)
+        self.health_check_done = False
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.settings_dict, conn_params)
+        connect = functools.partial(super().get_new_connection, conn_params)
+        if self.pool is None:
+            return connect()
+        check = is_usable if self.health_check_enabled else None
+        return self.pool.acquire(connect, check)
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_health_check_failed(self):
+        """reconnect if the connection died since the last request"""
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        # a broken connection inside a transaction has to fail
+        if not self.in_atomic_block and not self.is_usable():
+            self.errors_occurred = True
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, *args, **kwargs):
+        self.close_if_health_check_failed()
+        return super()._cursor(*args, **kwargs)
+
+    def close_if_unusable_or_obsolete(self):
+        # runs at the start and end of each request
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # the wrapper keeps using a connection closed in an atomic
+            # block until the block exits, it can't go back to the pool
+            if self.in_atomic_block or self.errors_occurred:
+                self.pool.discard(self.connection)
+            else:
+                self.pool.release(self.connection)
@@ -0,0 +1,149 @@
+"""
+in-process pool of raw psycopg2 connections.
+"""
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+from psycopg2 import extensions
+
+
+class ConnectionPool:
+    """bounded, thread safe pool of open connections of one database"""
+
+    def __init__(self, max_size, timeout, max_age):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        # idle connections, the most recently returned last
+        self._idle = []
+        # id(connection) -> when it was opened, idle or in use
+        self._opened = {}
+        self._connecting = 0
+        self._inherited = []
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+
+    @property
+    def size(self):
+        """connections open or being opened"""
+        return len(self._opened) + self._connecting
+
+    def acquire(self, connect, check=None):
+        """return an idle connection, open one, or wait for a free one"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            connection = self._take(deadline)
+            if connection is None:
+                break
+            # checked without holding the lock, the connection keeps its slot
+            if check is None or check(connection):
+                return connection
+            self.discard(connection)
+
+        # connect without holding the lock, the slot is reserved
+        try:
+            connection = connect()
+        except BaseException:
+            with self._lock:
+                self._connecting -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._connecting -= 1
+            self._opened[id(connection)] = time.monotonic()
+        return connection
+
+    def release(self, connection):
+        """take a connection back, closing it unless it is reusable"""
+        # the rollback is a round trip, the caller still owns the connection
+        reusable = (
+            self._pid == os.getpid()
+            and id(connection) in self._opened
+            and self._reset(connection)
+        )
+        with self._lock:
+            if id(connection) not in self._opened:
+                connection.close()
+            elif reusable and not self._expired(connection):
+                self._idle.append(connection)
+            else:
+                self._discard(connection)
+            self._lock.notify()
+
+    def discard(self, connection):
+        """close a connection that must not be reused"""
+        with self._lock:
+            if id(connection) in self._opened:
+                self._discard(connection)
+            else:
+                connection.close()
+            self._lock.notify()
+
+    def close_all(self):
+        """close every idle connection"""
+        with self._lock:
+            while self._idle:
+                self._discard(self._idle.pop())
+
+    def _take(self, deadline):
+        """
+        pop an idle connection, or reserve a slot for a new one and return
+        None, waiting until the deadline for a free one.
+        """
+        with self._lock:
+            self._after_fork()
+            while True:
+                while self._idle:
+                    connection = self._idle.pop()
+                    if self._expired(connection):
+                        self._discard(connection)
+                        continue
+                    return connection
+                if self.size < self.max_size:
+                    self._connecting += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._lock.wait(remaining):
+                    raise OperationalError(
+                        f'no database connection free after {self.timeout}s, '
+                        f'{self.max_size} in use'
+                    )
+
+    def _expired(self, connection):
+        age = time.monotonic() - self._opened[id(connection)]
+        return bool(connection.closed) or age >= self.max_age
+
+    def _discard(self, connection):
+        del self._opened[id(connection)]
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _reset(self, connection):
+        """end any open transaction, False if the connection is broken"""
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        try:
+            connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    def _after_fork(self):
+        """forget the connections of the parent process"""
+        if self._pid != os.getpid():
+            # their sockets are the parent's, closing them here would end
+            # its sessions: keep the objects alive and never use them
+            self._inherited.extend(self._idle)
+            self._idle = []
+            self._opened = {}
+            self._connecting = 0
+            self._pid = os.getpid()
@@ -0,0 +1,152 @@
+"""
+django command measuring requests/sec of a short api request with and
+without persistent and pooled database connections.
+"""
+import io
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.postgresql import base as postgresql
+from django.test.utils import override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core.backends.postgresql.base import DatabaseWrapper, close_pools
+from core.models import Tag
+
+PATH = '/api/proguide/tags/'
+
+# label, database settings
+SETUPS = [
+    ('new connection per request',
+     {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'POOL': {}}),
+    ('persistent',
+     {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': False, 'POOL': {}}),
+    ('persistent, health checks',
+     {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'POOL': {}}),
+    ('pool, health checks',
+     {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'POOL': None}),
+]
+
+
+class Command(BaseCommand):
+    "django command to benchmark database connection handling"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='requests sent per setup',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='threads of the WSGI worker (uwsgi --threads)',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header sent, must be in ALLOWED_HOSTS',
+        )
+
+    def handle(self, *args, **options):
+        """ entrypoint for command. """
+        if not isinstance(connections['default'], DatabaseWrapper):
+            raise CommandError(
+                "needs the 'core.backends.postgresql' database ENGINE")
+
+        user, token = self._create_data()
+        settings_dict = connections['default'].settings_dict
+        original = {key: settings_dict.get(key) for key in SETUPS[0][1]}
+        application = get_wsgi_application()
+        try:
+            for label, setup in SETUPS:
+                connections.close_all()
+                close_pools()
+                settings_dict.update(setup)
+                if setup['POOL'] is None:
+                    settings_dict['POOL'] = {'MAX_SIZE': options['threads']}
+                # every request has to reach the database
+                with override_settings(
+                    PROGUIDE_CACHE={**settings.PROGUIDE_CACHE, 'TIMEOUT': 0},
+                ):
+                    elapsed, connects = self._run(
+                        application, token, options)
+                self.stdout.write(
+                    f'{label}: {options["requests"] / elapsed:,.1f} '
+                    f'req/sec, {connects} connections opened'
+                )
+        finally:
+            connections.close_all()
+            close_pools()
+            settings_dict.update(original)
+            user.delete()
+
+    def _create_data(self):
+        """create a user with a token and a few tags"""
+        user = get_user_model().objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex}@example.com',
+        )
+        token = Token.objects.create(user=user)
+        Tag.objects.bulk_create([
+            Tag(user=user, name=f'tag {i}') for i in range(10)
+        ])
+        return user, token
+
+    def _run(self, application, token, options):
+        """serve the requests on worker threads, return time and connects"""
+        remaining = iter(range(options['requests']))
+        lock = threading.Lock()
+        errors = []
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': PATH,
+            'QUERY_STRING': '',
+            'SERVER_NAME': options['host'],
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': options['host'],
+            'HTTP_AUTHORIZATION': f'Token {token.key}',
+            'wsgi.url_scheme': 'http',
+        }
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    status = []
+                    response = application(
+                        {**environ, 'wsgi.input': io.BytesIO(),
+                         'wsgi.errors': io.StringIO()},
+                        lambda value, headers: status.append(value),
+                    )
+                    b''.join(response)
+                    response.close()
+                    if not status[0].startswith('200'):
+                        errors.append(status[0])
+                        return
+            finally:
+                # like a worker thread exiting
+                connections.close_all()
+
+        # counts the connections opened on the server
+        with mock.patch.object(postgresql.Database, 'connect',
+                               wraps=postgresql.Database.connect) as connect:
+            threads = [threading.Thread(target=worker)
+                       for _ in range(max(options['threads'], 1))]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+        if errors:
+            raise CommandError(f'responses {errors[:5]}')
+        return elapsed, connect.call_count
@@ -0,0 +1,126 @@
+"""
+django command measuring WSGI worker startup with and without warm-up.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# requests every worker serves first, none of them touches the database
+PATHS = ['/api/schema/', '/api/proguide/proguides/', '/api/user/me/']
+
+
+def memory_usage():
+    """return (rss, private) memory of this process in MB (linux only)"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            key, _, rest = line.partition(':')
+            if rest.strip().endswith('kB'):
+                values[key] = int(rest.split()[0])
+    private = values['Private_Clean'] + values['Private_Dirty']
+    return values['Rss'] / 1024, private / 1024
+
+
+class Command(BaseCommand):
+    "django command to benchmark wsgi worker startup"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='workers forked from the master, like uwsgi --workers',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header sent, must be in ALLOWED_HOSTS',
+        )
+        # internal: run as the master process of one measurement
+        parser.add_argument('--master', choices=['cold', 'warm'],
+                            help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        """ entrypoint for command. """
+        if options['master']:
+            return self._master(options)
+
+        for mode in ('cold', 'warm'):
+            # a fresh interpreter per mode, like a deploy
+            env = dict(os.environ, WSGI_WARMUP=str(int(mode == 'warm')))
+            result = subprocess.run(
+                [sys.executable, '-m', 'django', 'benchmark_startup',
+                 '--master', mode, '--workers', str(options['workers']),
+                 '--host', options['host']],
+                cwd=settings.BASE_DIR, env=env, capture_output=True,
+                text=True,
+            )
+            if result.returncode:
+                raise CommandError(result.stderr)
+            stats = json.loads(result.stdout.splitlines()[-1])
+            workers = stats['workers']
+            count = len(workers)
+            self.stdout.write(
+                f'{mode}: master load {stats["load"]:.2f}s, '
+                f'first request '
+                f'{sum(w["first"] for w in workers) / count * 1000:.0f}ms, '
+                f'next request '
+                f'{sum(w["next"] for w in workers) / count * 1000:.0f}ms, '
+                f'worker rss {sum(w["rss"] for w in workers) / count:.1f}MB '
+                f'(private '
+                f'{sum(w["private"] for w in workers) / count:.1f}MB)'
+            )
+
+    def _master(self, options):
+        """load app.wsgi, fork the workers, print their stats as json"""
+        start = time.perf_counter()
+        from app.wsgi import application
+        load = time.perf_counter() - start
+
+        workers = []
+        for _ in range(options['workers']):
+            read_end, write_end = os.pipe()
+            if os.fork() == 0:
+                os.close(read_end)
+                stats = self._worker(application, options['host'])
+                os.write(write_end, json.dumps(stats).encode())
+                os._exit(0)
+            os.close(write_end)
+            with os.fdopen(read_end) as pipe:
+                workers.append(json.loads(pipe.read()))
+            os.wait()
+
+        self.stdout.write(json.dumps({'load': load, 'workers': workers}))
+
+    def _worker(self, application, host):
+        """serve the first requests, return timings and memory"""
+        timings = []
+        for _ in range(2):
+            start = time.perf_counter()
+            for path in PATHS:
+                self._request(application, path, host)
+            timings.append(time.perf_counter() - start)
+        rss, private = memory_usage()
+        return {'first': timings[0], 'next': timings[1],
+                'rss': rss, 'private': private}
+
+    def _request(self, application, path, host):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': host,
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+        }
+        response = application(environ, lambda status, headers: None)
+        b''.join(response)
+        response.close()
@@ -0,0 +1,28 @@
+"""
+django command to write the OpenAPI schema served by /api/schema/.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app import schema
+
+
+class Command(BaseCommand):
+    "django command to generate the schema files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=settings.SCHEMA_CACHE_DIR,
+            help='output directory, SCHEMA_CACHE_DIR by default',
+        )
+
+    def handle(self, *args, **options):
+        """ entrypoint for command. """
+        if not options['dir']:
+            raise CommandError('set SCHEMA_CACHE_DIR or pass --dir')
+        generated = schema.build()
+        schema.write(generated, options['dir'])
+        self.stdout.write(self.style.SUCCESS(
+            f'schema written to {options["dir"]} '
+            f'({", ".join(sorted(generated))})'
+        ))
@@ -0,0 +1,299 @@
+"""
+per-request timings and per-route metrics.
+
+ServerTimingMiddleware (core.middleware) collects the timings of each
+request: database queries (an execute wrapper on every connection),
+serializer `.data` and response rendering. they are sent back in a
+Server-Timing header and added to the process' metrics.
+
+every process keeps its own counters and histograms; with METRICS['DIR']
+set each one writes them to a file of its own there every
+FLUSH_INTERVAL seconds, and the metrics endpoint sums the files of all
+uwsgi workers into the prometheus text format.
+"""
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from rest_framework.serializers import BaseSerializer
+
+from core.queries import call_site
+
+# upper bounds (seconds) of the request duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help) of every metric family
+FAMILIES = {
+    'http_requests_total': (
+        'counter', 'requests served'),
+    'http_request_duration_seconds': (
+        'histogram', 'request duration'),
+    'http_request_db_queries_total': (
+        'counter', 'database queries run by requests'),
+    'http_request_db_seconds_total': (
+        'counter', 'time requests spent in database queries'),
+    'http_request_serializer_seconds_total': (
+        'counter', 'time requests spent in serializers, with their queries'),
+    'http_request_render_seconds_total': (
+        'counter', 'time requests spent rendering responses'),
+}
+
+_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """timings of one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.total = None
+        self.db_queries = 0
+        # phase -> seconds
+        self.durations = defaultdict(float)
+        # (sql, seconds, call site) of every query when inspected
+        self.queries = None
+        self._active = set()
+
+    def header(self):
+        """return the Server-Timing header value"""
+        metrics = [
+            f'db;dur={self.durations["db"] * 1000:.1f};'
+            f'desc="{self.db_queries} queries"'
+        ]
+        for name in ('serializer', 'render'):
+            if name in self.durations:
+                metrics.append(f'{name};dur={self.durations[name] * 1000:.1f}')
+        metrics.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def start_request():
+    """start timing a request, return its timings and the reset token"""
+    timings = RequestTimings()
+    return timings, _timings.set(timings)
+
+
+def end_request(timings, token):
+    _timings.reset(token)
+    timings.total = time.perf_counter() - timings.start
+
+
+def current_timings():
+    """return the timings of the current request, None outside one"""
+    return _timings.get()
+
+
+@contextmanager
+def timed(name):
+    """add the time spent in the block to a phase of the request"""
+    timings = _timings.get()
+    # nested blocks (serializers of serializers) are counted once
+    if timings is None or name in timings._active:
+        yield
+        return
+    timings._active.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - start
+        timings._active.discard(name)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute wrapper counting and timing the queries of a request"""
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        timings.db_queries += 1
+        timings.durations['db'] += duration
+        if timings.queries is not None:
+            timings.queries.append((sql, duration, call_site()))
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    # fired again whenever the thread's connection is reopened
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """time the `.data` of every serializer"""
+    data = BaseSerializer.data
+    if getattr(data.fget, 'timed', False):
+        return
+
+    @functools.wraps(data.fget)
+    def timed_data(serializer):
+        with timed('serializer'):
+            return data.fget(serializer)
+    timed_data.timed = True
+    BaseSerializer.data = property(timed_data)
+
+
+class Registry:
+    """counters and histograms of the requests served by this process"""
+
+    def __init__(self):
+        # (name, ((label, value), ...)) -> value
+        self._series = defaultdict(float)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._id = None
+        self._dirty = False
+
+    def observe(self, route, method, status, timings):
+        if self._pid != os.getpid():
+            self._start()
+        labels = (('route', route), ('method', method))
+        duration = timings.total
+        with self._lock:
+            series = self._series
+            series['http_requests_total',
+                   labels + (('status', str(status)),)] += 1
+            for bound in BUCKETS:
+                if duration <= bound:
+                    series['http_request_duration_seconds_bucket',
+                           labels + (('le', str(bound)),)] += 1
+            series['http_request_duration_seconds_bucket',
+                   labels + (('le', '+Inf'),)] += 1
+            series['http_request_duration_seconds_sum', labels] += duration
+            series['http_request_duration_seconds_count', labels] += 1
+            series['http_request_db_queries_total',
+                   labels] += timings.db_queries
+            for name in ('db', 'serializer', 'render'):
+                series[f'http_request_{name}_seconds_total',
+                       labels] += timings.durations.get(name, 0.0)
+            self._dirty = True
+
+    def snapshot(self):
+        """return the series as a json serializable list"""
+        with self._lock:
+            return [[name, list(labels), value]
+                    for (name, labels), value in self._series.items()]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def _path(self):
+        return os.path.join(settings.METRICS['DIR'], f'{self._id}.json')
+
+    def flush(self):
+        """write the series of this process to its file"""
+        if not settings.METRICS['DIR'] or self._pid != os.getpid():
+            return
+        with self._lock:
+            self._dirty = False
+        os.makedirs(settings.METRICS['DIR'], exist_ok=True)
+        path = self._path()
+        with open(f'{path}.tmp', 'w') as metrics_file:
+            json.dump(self.snapshot(), metrics_file)
+        os.replace(f'{path}.tmp', path)
+
+    def _start(self):
+        """start the series (and the flush thread) of this process"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # a forked worker does not count its parent's requests
+            self._series.clear()
+            self._pid = os.getpid()
+            self._id = f'{self._pid}-{uuid.uuid4().hex[:8]}'
+        if settings.METRICS['DIR']:
+            threading.Thread(target=self._flush_loop, daemon=True,
+                             name='metrics-flush').start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(settings.METRICS['FLUSH_INTERVAL'])
+            if self._dirty:
+                self.flush()
+
+
+registry = Registry()
+
+
+def collect():
+    """return the series of every process, summed"""
+    directory = settings.METRICS['DIR']
+    if not directory:
+        return registry.snapshot()
+    registry.flush()
+    totals = defaultdict(float)
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        names = []
+    for file_name in names:
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, file_name)) as metrics_file:
+                series = json.load(metrics_file)
+        except (OSError, ValueError):
+            # removed meanwhile
+            continue
+        for name, labels, value in series:
+            totals[name, tuple(map(tuple, labels))] += value
+    return [[name, list(labels), value]
+            for (name, labels), value in totals.items()]
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render_metrics(series):
+    """return series in the prometheus text exposition format"""
+    families = defaultdict(list)
+    for name, labels, value in series:
+        families[_family(name)].append((name, labels, value))
+
+    def bucket_order(item):
+        name, labels, _ = item
+        labels = dict(labels)
+        le = labels.pop('le', None)
+        bound = float('inf') if le in (None, '+Inf') else float(le)
+        return name, sorted(labels.items()), bound
+
+    lines = []
+    for family in sorted(families):
+        metric_type, description = FAMILIES.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {metric_type}')
+        for name, labels, value in sorted(families[family], key=bucket_order):
+            label_text = ','.join(
+                f'{label}="{_escape(value_text)}"'
+                for label, value_text in labels)
+            lines.append(f'{name}{{{label_text}}} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
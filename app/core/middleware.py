@@ -0,0 +1,159 @@
+"""
+middleware for the apis.
+"""
+import random
+import time
+
+from asgiref.sync import (
+    async_to_sync,
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from core import metrics, profiling, queries
+
+
+def route_name(request):
+    """label of the url pattern, not of the url (ids vary)"""
+    match = request.resolver_match
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class SyncAndAsyncMiddleware:
+    """
+    base of middleware serving both handlers: under ASGI the chain stays
+    async (django would adapt it, and hold a thread per request, for a
+    sync only middleware). subclasses implement __acall__ too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.call(request)
+
+
+class ServerTimingMiddleware(SyncAndAsyncMiddleware):
+    """
+    time every request: Server-Timing header and per-route metrics.
+    first in MIDDLEWARE, so the total covers the other middleware too.
+    """
+
+    def call(self, request):
+        timings, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(timings, token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(timings, token)
+        return self._finish(request, response, timings)
+
+    def _finish(self, request, response, timings):
+        response['Server-Timing'] = timings.header()
+        metrics.registry.observe(
+            route_name(request), request.method, response.status_code,
+            timings,
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # the last hook before django renders the response
+        timings = metrics.current_timings()
+        if timings is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                timings.durations['render'] += time.perf_counter() - start
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class QueryInspectionMiddleware(SyncAndAsyncMiddleware):
+    """
+    log slow and repeated queries of a sample of the requests
+    (core.queries), QUERY_INSPECTION['ENABLED'] turns it on.
+    needs ServerTimingMiddleware before it, which times the queries.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTION['ENABLED']:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.sample_rate = settings.QUERY_INSPECTION['SAMPLE_RATE']
+
+    def _sampled(self):
+        """return the timings to inspect, None when not sampled"""
+        timings = metrics.current_timings()
+        if timings is None or random.random() >= self.sample_rate:
+            return None
+        timings.queries = []
+        return timings
+
+    def _report(self, request, timings):
+        inspected, timings.queries = timings.queries, None
+        queries.report(route_name(request), inspected)
+
+    def call(self, request):
+        timings = self._sampled()
+        if timings is None:
+            return self.get_response(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self._report(request, timings)
+
+    async def __acall__(self, request):
+        timings = self._sampled()
+        if timings is None:
+            return await self.get_response(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            self._report(request, timings)
+
+
+class ProfilingMiddleware(SyncAndAsyncMiddleware):
+    """
+    profile the /api/ requests of staff users asking for it
+    (core.profiling), after AuthenticationMiddleware for the session user.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING['ENABLED']:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        mode = profiling.requested_mode(request)
+        if mode is None or not profiling.is_staff(request):
+            return self.get_response(request)
+        return profiling.profile(request, self.get_response, mode)
+
+    async def __acall__(self, request):
+        mode = profiling.requested_mode(request)
+        if mode is None or not await sync_to_async(profiling.is_staff)(
+                request):
+            return await self.get_response(request)
+        # profiled in one thread: the sync views and middleware of the
+        # chain run in the thread waiting in async_to_sync
+        return await sync_to_async(profiling.profile)(
+            request, async_to_sync(self.get_response), mode)
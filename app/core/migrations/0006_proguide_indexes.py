@@ -0,0 +1,29 @@
+# Generated by Django 4.0.10 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_proguide_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proguide',
+            index=models.Index(fields=['user', '-id'], name='core_proguide_user_id_idx'),
+        ),
+        # reverse indexes on the auto-created through tables, so tag and
+        # ingredient filters can probe (tag_id, proguide_id) index-only
+        migrations.RunSQL(
+            'CREATE INDEX core_proguide_tags_tag_pg_idx '
+            'ON core_proguide_tags (tag_id, proguide_id);',
+            reverse_sql='DROP INDEX core_proguide_tags_tag_pg_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_proguide_ingredients_ing_pg_idx '
+            'ON core_proguide_ingredients (ingredient_id, proguide_id);',
+            reverse_sql='DROP INDEX core_proguide_ingredients_ing_pg_idx;',
+        ),
+    ]
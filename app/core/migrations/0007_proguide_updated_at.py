@@ -0,0 +1,20 @@
+# Generated by Django 4.0.10 on 2026-10-18 03:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_proguide_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proguide',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='زمان ویرایش'),
+            preserve_default=False,
+        ),
+    ]
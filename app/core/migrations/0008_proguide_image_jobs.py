@@ -0,0 +1,36 @@
+# Generated by Django 4.0.10 on 2026-10-18 03:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_proguide_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proguide',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, verbose_name='نسخه های تصویر'),
+        ),
+        migrations.CreateModel(
+            name='ProGuideImageJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(max_length=255, verbose_name='تصویر')),
+                ('status', models.CharField(choices=[('pending', 'در صف'), ('processing', 'در حال پردازش'), ('done', 'انجام شده'), ('failed', 'ناموفق')], default='pending', max_length=20, verbose_name='وضعیت')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='تلاش ها')),
+                ('error', models.TextField(blank=True, verbose_name='خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان ایجاد')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='زمان ویرایش')),
+                ('proguide', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_jobs', to='core.proguide', verbose_name='راهنما')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='proguideimagejob',
+            index=models.Index(fields=['status', 'created_at'], name='core_imagejob_status_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.0.10 on 2026-10-18 02:38
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# the trigger keeps search_vector in sync with every insert and with any
+# update writing title or description (orm save, bulk_update, raw sql)
+POSTGRES_FORWARDS = [
+    """
+    CREATE FUNCTION core_proguide_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')),
+                      'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER core_proguide_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, search_vector
+    ON core_proguide
+    FOR EACH ROW EXECUTE FUNCTION core_proguide_search_vector_update();
+    """,
+    # backfill existing rows through the trigger
+    'UPDATE core_proguide SET title = title;',
+    'CREATE INDEX core_proguide_search_idx '
+    'ON core_proguide USING gin (search_vector);',
+]
+POSTGRES_BACKWARDS = [
+    'DROP INDEX IF EXISTS core_proguide_search_idx;',
+    'DROP TRIGGER IF EXISTS core_proguide_search_vector_trigger '
+    'ON core_proguide;',
+    'DROP FUNCTION IF EXISTS core_proguide_search_vector_update();',
+]
+
+
+def run_on_postgres(statements):
+    """run the statements on postgres only, other backends search with
+    LIKE (see proguide.search)"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_proguide_image_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proguide',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='بردار جستجو'),
+        ),
+        migrations.RunPython(
+            run_on_postgres(POSTGRES_FORWARDS),
+            run_on_postgres(POSTGRES_BACKWARDS),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.0.10 on 2026-10-18 02:42
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+
+def merge_duplicates_sql(table, through, column):
+    """
+    keep the oldest row of every (user, lower(name)) group: move the
+    links of the other rows to it, then delete them. plain sql, valid on
+    postgres and sqlite.
+    """
+    keeper = (
+        f'(SELECT MIN(o.id) FROM {table} o '
+        f'WHERE o.user_id = d.user_id AND LOWER(o.name) = LOWER(d.name))'
+    )
+    duplicates = f'SELECT d.id FROM {table} d WHERE d.id <> {keeper}'
+    return [
+        # link every proguide of a duplicate to the keeper, once
+        f'INSERT INTO {through} (proguide_id, {column}) '
+        f'SELECT DISTINCT t.proguide_id, k.keep_id FROM {through} t '
+        f'JOIN (SELECT d.id, {keeper} AS keep_id FROM {table} d) k '
+        f'ON k.id = t.{column} '
+        f'WHERE k.keep_id <> k.id AND NOT EXISTS ('
+        f'SELECT 1 FROM {through} e '
+        f'WHERE e.proguide_id = t.proguide_id AND e.{column} = k.keep_id);',
+        f'DELETE FROM {through} WHERE {column} IN ({duplicates});',
+        f'DELETE FROM {table} WHERE id IN ({duplicates});',
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_tag_ingredient_user_name_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            merge_duplicates_sql('core_tag', 'core_proguide_tags', 'tag_id'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            merge_duplicates_sql('core_ingredient',
+                                 'core_proguide_ingredients',
+                                 'ingredient_id'),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), django.db.models.expressions.F('user'), name='core_ingredient_user_lower_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), django.db.models.expressions.F('user'), name='core_tag_user_lower_name_uniq'),
+        ),
+    ]
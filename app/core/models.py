@@ -8,6 +8,8 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 import uuid
@@ -75,11 +77,63 @@ class ProGuide(models.Model):
     image = models.ImageField(_("تصویر"), upload_to=proguide_image_file_path,
                               height_field=None, width_field=None,
                               max_length=None, null=True)
+    # resized copies of image, {variant name: storage path}
+    image_variants = models.JSONField(_("نسخه های تصویر"), default=dict,
+                                      blank=True)
+    # bumped on every save, used as the conditional GET validator
+    updated_at = models.DateTimeField(_("زمان ویرایش"), auto_now=True)
+    # weighted title/description vector, kept up to date by a trigger on
+    # postgres (GIN indexed there, see migration 0009), unused elsewhere
+    search_vector = SearchVectorField(_("بردار جستجو"), null=True,
+                                      editable=False)
+
+    class Meta:
+        indexes = [
+            # per-user listing, newest first (keyset pagination)
+            models.Index(fields=['user', '-id'],
+                         name='core_proguide_user_id_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class ProGuideImageJob(models.Model):
+    """queued job generating the image variants of a proguide"""
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, _("در صف")),
+        (PROCESSING, _("در حال پردازش")),
+        (DONE, _("انجام شده")),
+        (FAILED, _("ناموفق")),
+    ]
+
+    proguide = models.ForeignKey(ProGuide, verbose_name=_("راهنما"),
+                                 related_name='image_jobs',
+                                 on_delete=models.CASCADE)
+    # the uploaded file this job was queued for
+    image = models.CharField(_("تصویر"), max_length=255)
+    status = models.CharField(_("وضعیت"), max_length=20,
+                              choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(_("تلاش ها"), default=0)
+    error = models.TextField(_("خطا"), blank=True)
+    created_at = models.DateTimeField(_("زمان ایجاد"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("زمان ویرایش"), auto_now=True)
+
+    class Meta:
+        indexes = [
+            # workers poll the oldest pending job
+            models.Index(fields=['status', 'created_at'],
+                         name='core_imagejob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.proguide_id}: {self.image} ({self.status})'
+
+
 class Tag(models.Model):
     """tag for filtering ProGuide"""
     name = models.CharField(_("اسم"), max_length=503)
@@ -89,6 +143,16 @@ class Tag(models.Model):
     class Meta:
         verbose_name = _("تگ")
         verbose_name_plural = _("تگها")
+        indexes = [
+            # per-user listing ordered by name
+            models.Index(fields=['user', 'name'],
+                         name='core_tag_user_name_idx'),
+        ]
+        constraints = [
+            # one tag per name and user, whatever the letter case
+            models.UniqueConstraint(Lower('name'), 'user',
+                                    name='core_tag_user_lower_name_uniq'),
+        ]
 
     def __str__(self):
         return self.name
@@ -100,5 +164,19 @@ class Ingredient(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              verbose_name=_("کاربر"), on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # per-user listing ordered by name
+            models.Index(fields=['user', 'name'],
+                         name='core_ingredient_user_name_idx'),
+        ]
+        constraints = [
+            # one ingredient per name and user, whatever the letter case
+            models.UniqueConstraint(
+                Lower('name'), 'user',
+                name='core_ingredient_user_lower_name_uniq',
+            ),
+        ]
+
     def __str__(self):
         return self.name
@@ -0,0 +1,172 @@
+"""
+on demand profiling of api requests by staff users.
+
+a staff user adds `?profile=1` (or an `X-Profile: 1` header) to any /api/
+request and gets a report instead of the response: the timings of the
+request with the database time and every query split out, then the
+cProfile stats of the request. `profile=stacks` samples the stack of the
+request every PROFILING['INTERVAL'] seconds instead and returns them
+folded, one `frame;frame;... count` line per stack, ready for
+flamegraph.pl or speedscope; samples taken during a query end in `[db]`.
+
+only the thread serving the request is profiled (under ASGI the async
+views run their queries in other threads). requests without the
+parameter or header only pay for the check.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from rest_framework import exceptions
+
+from core import metrics
+from user.authentication import CachedTokenAuthentication
+
+MODES = {'1': 'cprofile', 'cprofile': 'cprofile', 'stacks': 'stacks'}
+
+
+def requested_mode(request):
+    """return the profiling mode asked for by the request, or None"""
+    value = request.GET.get('profile') or request.META.get('HTTP_X_PROFILE')
+    if value is None or not request.path.startswith('/api/'):
+        return None
+    return MODES.get(value)
+
+
+def is_staff(request):
+    """whether the session or the token of the request is a staff user"""
+    if request.user.is_staff:
+        return True
+    try:
+        result = CachedTokenAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def _frame_name(code):
+    filename = code.co_filename
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir):
+        filename = os.path.relpath(filename, base_dir)
+    else:
+        filename = filename.rpartition('site-packages/')[2]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class StackSampler:
+    """sample the stack of a thread from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='profile-sampler')
+
+    # same interface as cProfile.Profile
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        names = []
+        in_query = False
+        while frame is not None:
+            if frame.f_code is metrics.record_query.__code__:
+                in_query = True
+            names.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        if in_query:
+            names.append('[db]')
+        return ';'.join(names)
+
+    def folded(self):
+        """return the samples in the folded stack format"""
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+def summary(request, response, total, timings, queries):
+    """return the timings and queries of a profiled request as text"""
+    lines = [
+        f'{request.method} {request.get_full_path()} '
+        f'-> {response.status_code}',
+        f'total {total * 1000:.1f} ms',
+    ]
+    if timings is not None:
+        durations = timings.durations
+        db = sum(duration for _, duration, _ in queries)
+        lines.append(
+            f'db {db * 1000:.1f} ms in {len(queries)} queries, '
+            f'serializer {durations.get("serializer", 0.0) * 1000:.1f} ms, '
+            f'render {durations.get("render", 0.0) * 1000:.1f} ms, '
+            f'other {(total - db) * 1000:.1f} ms'
+        )
+        lines.append('')
+        for sql, duration, site in queries:
+            lines.append(f'{duration * 1000:8.2f} ms  {site}')
+            lines.append(f'            {sql}')
+    return '\n'.join(lines) + '\n'
+
+
+def profile(request, get_response, mode):
+    """serve the request under the profiler, return the report response"""
+    timings = metrics.current_timings()
+    if timings is not None:
+        # shares the query list of an inspected request
+        owned = timings.queries is None
+        if owned:
+            timings.queries = []
+        first_query = len(timings.queries)
+
+    if mode == 'stacks':
+        profiler = StackSampler(threading.get_ident(),
+                                settings.PROFILING['INTERVAL'])
+    else:
+        profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        response = get_response(request)
+    finally:
+        profiler.disable()
+        total = time.perf_counter() - start
+        queries = []
+        if timings is not None:
+            queries = timings.queries[first_query:]
+            if owned:
+                timings.queries = None
+
+    if mode == 'stacks':
+        report = profiler.folded()
+    else:
+        stats_text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_text)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+            settings.PROFILING['LIMIT'])
+        report = (summary(request, response, total, timings, queries)
+                  + stats_text.getvalue())
+
+    profiled = HttpResponse(report, content_type='text/plain; charset=utf-8')
+    profiled['X-Profiled-Status'] = response.status_code
+    return profiled
@@ -0,0 +1,87 @@
+"""
+slow query and repeated query (N+1) detection.
+
+QueryInspectionMiddleware (core.middleware) keeps the queries of a sample
+of the requests: ServerTimingMiddleware already times every query, for
+those requests it also stores the sql and the call site. at the end of
+the request, queries slower than SLOW_MS and query shapes run at least
+REPEAT_THRESHOLD times are logged to the `core.queries` logger with the
+route.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from rest_framework.serializers import Serializer
+
+logger = logging.getLogger(__name__)
+
+# frames of these modules are never the call site
+_SKIPPED = tuple(
+    os.path.join(os.path.dirname(__file__), name)
+    for name in ('metrics.py', 'queries.py', 'middleware.py', 'backends')
+)
+
+# fields of a serializer are read (and queried) in this frame
+_SERIALIZER_TO_REPRESENTATION = Serializer.to_representation.__code__
+
+# placeholder lists of IN (...) / VALUES of any length
+_PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_VALUES_LIST = re.compile(r'\(%s\.\.\.\)(?:\s*,\s*\(%s\.\.\.\))+')
+_NUMBER = re.compile(r'\b\d+\b')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """return the shape of a query: values and list lengths removed"""
+    sql = _PLACEHOLDER_LIST.sub('(%s...)', sql)
+    sql = _VALUES_LIST.sub('(%s...)', sql)
+    # numbers written into the sql (LIMIT 21)
+    sql = _NUMBER.sub('N', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def call_site():
+    """
+    return 'file:line in function' of the app code running a query, and
+    the serializer field (N+1 of nested serializers) when there is one.
+    """
+    base_dir = str(settings.BASE_DIR)
+    field = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if field is None and code is _SERIALIZER_TO_REPRESENTATION:
+            local = frame.f_locals
+            if 'field' in local:
+                field = (f'{type(local["self"]).__name__}.'
+                         f'{local["field"].field_name}')
+        if code.co_filename.startswith(base_dir) and not \
+                code.co_filename.startswith(_SKIPPED):
+            site = (f'{os.path.relpath(code.co_filename, base_dir)}:'
+                    f'{frame.f_lineno} in {code.co_name}')
+            return f'{site} ({field})' if field else site
+        frame = frame.f_back
+    return field or 'unknown'
+
+
+def report(route, queries):
+    """log the slow and repeated queries of a request"""
+    options = settings.QUERY_INSPECTION
+    shapes = defaultdict(list)
+    for sql, duration, site in queries:
+        shape = normalize(sql)
+        shapes[shape].append(site)
+        if duration * 1000 >= options['SLOW_MS']:
+            logger.warning('slow query (%.1f ms) on %s at %s: %s',
+                           duration * 1000, route, site, shape)
+
+    for shape, sites in shapes.items():
+        if len(sites) >= options['REPEAT_THRESHOLD']:
+            site, _ = Counter(sites).most_common(1)[0]
+            logger.warning('repeated query (%d times) on %s at %s: %s',
+                           len(sites), route, site, shape)
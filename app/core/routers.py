@@ -0,0 +1,75 @@
+"""
+database router sending the reads of some requests to a replica.
+
+reads use the `replica` database (when configured) only inside
+`replica_reads()` after `use_replica()`, and only until the first write
+of the block: from there on every read of the request stays on the
+primary and sees what was just written. reads inside a transaction of
+the primary stay on it too.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+# None outside of replica_reads()
+_wrote = ContextVar('wrote', default=None)
+
+
+def replica_configured():
+    """return whether a replica database is configured"""
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    """scope of one request, reads start on the primary"""
+    replica_reads_token = _replica_reads.set(False)
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _replica_reads.reset(replica_reads_token)
+
+
+def use_replica():
+    """send the next reads of the block to the replica"""
+    _replica_reads.set(replica_configured())
+
+
+def wrote():
+    """return whether the block wrote to the database"""
+    return bool(_wrote.get())
+
+
+class ReplicaRouter:
+    """route reads to the replica inside replica_reads()"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _wrote.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # the replica doesn't see what this transaction wrote
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # related objects come from where the instance was read
+            return instance._state.db
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if _wrote.get() is False:
+            _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
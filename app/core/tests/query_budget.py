@@ -0,0 +1,50 @@
+"""
+helpers for keeping api endpoints inside a fixed query budget.
+"""
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+# transaction bookkeeping TestCase adds around atomic blocks
+IGNORED_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+# maximum number of sql queries allowed per endpoint (url name + method),
+# whatever the number of rows returned
+QUERY_BUDGETS = {
+    ('proguide:proguide-list', 'GET'): 3,
+    ('proguide:proguide-list', 'POST'): 11,
+    # one extra query reads updated_at for the ETag
+    ('proguide:proguide-detail', 'GET'): 4,
+    ('proguide:proguide-detail', 'PATCH'): 11,
+    ('proguide:proguide-detail', 'PUT'): 11,
+    ('proguide:proguide-bulk', 'POST'): 11,
+    # ids found, rows for the signals, the related tables, the proguides
+    ('proguide:proguide-bulk', 'DELETE'): 6,
+}
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for asserting endpoints stay inside their budget"""
+
+    @contextmanager
+    def assertQueryBudget(self, url_name, method='GET'):
+        """fail if the wrapped block runs more queries than the budget"""
+        budget = QUERY_BUDGETS[(url_name, method)]
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        queries = [
+            query['sql'] for query in context.captured_queries
+            if not query['sql'].startswith(IGNORED_PREFIXES)
+        ]
+        executed = len(queries)
+        if executed > budget:
+            listing = '\n'.join(
+                f'{i}. {sql}' for i, sql in enumerate(queries, start=1)
+            )
+            self.fail(
+                f'{method} {url_name} ran {executed} queries, '
+                f'budget is {budget}:\n{listing}'
+            )
@@ -3,12 +3,17 @@ test custom django management commands.
 """
 
 from unittest.mock import patch
+from io import StringIO
+import gc
 
 from psycopg2 import OperationalError as Psycopg2Error
 
 from django.core.management import call_command
 from django.db.utils import OperationalError
 from django.test import SimpleTestCase
+from django.urls import get_resolver
+
+from app.warmup import warm_up
 
 
 # this command were going to be mocking database
@@ -33,3 +38,25 @@ class ComandTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)  # 2 + 3 + True = 6
         patched_check.assert_called_with(databases=['default'])
+
+
+class WarmUpTests(SimpleTestCase):
+    """test the pre-fork warm-up and its benchmark."""
+
+    def test_warm_up(self):
+        """test warm-up fills the url tables and freezes the gc."""
+        self.addCleanup(gc.unfreeze)
+
+        warm_up()
+
+        self.assertTrue(get_resolver()._populated)
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    def test_benchmark_startup(self):
+        """test the benchmark reports cold and warm workers."""
+        out = StringIO()
+
+        call_command('benchmark_startup', '--workers', '1', stdout=out)
+
+        self.assertIn('cold:', out.getvalue())
+        self.assertIn('warm:', out.getvalue())
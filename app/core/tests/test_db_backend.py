@@ -0,0 +1,241 @@
+"""
+tests for the pooled postgresql backend.
+"""
+import os
+import threading
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.utils import OperationalError
+from django.test import SimpleTestCase, TransactionTestCase
+from psycopg2 import extensions
+
+from core.backends.postgresql import base
+from core.backends.postgresql.pool import ConnectionPool
+
+
+def fake_connection():
+    """return a stand-in for an idle psycopg2 connection"""
+    connection = MagicMock(closed=0)
+    connection.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    return connection
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """test the connection pool."""
+
+    def setUp(self):
+        self.pool = ConnectionPool(max_size=2, timeout=0.05, max_age=60)
+
+    def test_connection_reused(self):
+        """test a released connection is handed out again."""
+        connection = self.pool.acquire(fake_connection)
+        self.pool.release(connection)
+
+        self.assertIs(self.pool.acquire(fake_connection), connection)
+        self.assertEqual(self.pool.size, 1)
+        connection.close.assert_not_called()
+
+    def test_pool_exhausted(self):
+        """test waiting for a connection times out when all are used."""
+        self.pool.acquire(fake_connection)
+        self.pool.acquire(fake_connection)
+
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(fake_connection)
+
+    def test_waiting_for_release(self):
+        """test a waiting thread gets the connection released."""
+        self.pool.timeout = 5
+        first = self.pool.acquire(fake_connection)
+        self.pool.acquire(fake_connection)
+        threading.Timer(0.05, self.pool.release, [first]).start()
+
+        self.assertIs(self.pool.acquire(fake_connection), first)
+
+    def test_open_transaction_rolled_back(self):
+        """test a connection is returned without its transaction."""
+        connection = self.pool.acquire(fake_connection)
+        connection.info.transaction_status = \
+            extensions.TRANSACTION_STATUS_INTRANS
+
+        self.pool.release(connection)
+
+        connection.rollback.assert_called_once()
+        self.assertIs(self.pool.acquire(fake_connection), connection)
+
+    def test_broken_connection_closed(self):
+        """test a broken connection is closed instead of reused."""
+        connection = self.pool.acquire(fake_connection)
+        connection.info.transaction_status = \
+            extensions.TRANSACTION_STATUS_UNKNOWN
+
+        self.pool.release(connection)
+
+        connection.close.assert_called_once()
+        self.assertEqual(self.pool.size, 0)
+
+    def test_failed_check_reconnects(self):
+        """test an idle connection failing the check is replaced."""
+        connection = self.pool.acquire(fake_connection)
+        self.pool.release(connection)
+
+        new = self.pool.acquire(fake_connection, check=lambda conn: False)
+
+        self.assertIsNot(new, connection)
+        connection.close.assert_called_once()
+        self.assertEqual(self.pool.size, 1)
+
+    def test_check_outside_lock(self):
+        """test other threads use the pool while a connection is checked."""
+        connection = self.pool.acquire(fake_connection)
+        self.pool.release(connection)
+        free = []
+
+        def check(conn):
+            thread = threading.Thread(
+                target=lambda: free.append(self.pool.acquire(fake_connection)))
+            thread.start()
+            thread.join()
+            return True
+
+        self.assertIs(self.pool.acquire(fake_connection, check), connection)
+        self.assertEqual(len(free), 1)
+        self.assertIsNot(free[0], connection)
+        self.assertEqual(self.pool.size, 2)
+
+    def test_expired_connection_closed(self):
+        """test connections older than max_age are not reused."""
+        self.pool.max_age = 0
+        connection = self.pool.acquire(fake_connection)
+
+        self.pool.release(connection)
+
+        connection.close.assert_called_once()
+
+    def test_failed_connect_frees_slot(self):
+        """test a failed connect does not use up the pool."""
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(MagicMock(side_effect=OperationalError))
+
+        self.assertEqual(self.pool.size, 0)
+
+    def test_connections_not_shared_after_fork(self):
+        """test a forked process does not use the parent connections."""
+        connection = self.pool.acquire(fake_connection)
+        self.pool.release(connection)
+
+        with patch('os.getpid', return_value=os.getpid() + 1):
+            new = self.pool.acquire(fake_connection)
+
+        self.assertIsNot(new, connection)
+        connection.close.assert_not_called()
+
+
+class DatabaseWrapperTests(SimpleTestCase):
+    """test health checks and pooling of the database wrapper."""
+
+    def setUp(self):
+        patcher = patch.dict(base._pools, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _wrapper(self, **settings):
+        settings_dict = {
+            'ENGINE': 'core.backends.postgresql', 'NAME': 'app',
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': 0, 'ATOMIC_REQUESTS': False,
+            **settings,
+        }
+        wrapper = base.DatabaseWrapper(settings_dict)
+        connect = patch(
+            'django.db.backends.postgresql.base.DatabaseWrapper'
+            '.get_new_connection',
+            side_effect=lambda params: fake_connection(),
+        )
+        self.connect = connect.start()
+        self.addCleanup(connect.stop)
+        for name in ('init_connection_state', '_set_autocommit'):
+            patcher = patch.object(wrapper, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return wrapper
+
+    def test_pool_reuses_connection(self):
+        """test closing gives the connection to the next wrapper."""
+        pool = {'MAX_SIZE': 2}
+        first = self._wrapper(POOL=pool)
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+
+        second = self._wrapper(POOL=pool)
+        second.ensure_connection()
+
+        self.assertIs(second.connection, raw)
+        raw.close.assert_not_called()
+
+    def test_no_pool(self):
+        """test closing closes the connection without a pool."""
+        wrapper = self._wrapper()
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+
+        wrapper.close()
+
+        raw.close.assert_called_once()
+
+    def test_health_check_reconnects(self):
+        """test a dead persistent connection is replaced."""
+        wrapper = self._wrapper(CONN_HEALTH_CHECKS=True, CONN_MAX_AGE=60)
+        wrapper.ensure_connection()
+        dead = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+
+        with patch.object(wrapper, 'is_usable', return_value=False):
+            wrapper.cursor()
+
+        self.assertIsNot(wrapper.connection, dead)
+        dead.close.assert_called_once()
+        self.assertEqual(self.connect.call_count, 2)
+
+    def test_health_check_once_per_request(self):
+        """test the connection is checked on first use only."""
+        wrapper = self._wrapper(CONN_HEALTH_CHECKS=True, CONN_MAX_AGE=60)
+        wrapper.ensure_connection()
+        wrapper.close_if_unusable_or_obsolete()
+
+        with patch.object(wrapper, 'is_usable', return_value=True) as usable:
+            wrapper.cursor()
+            wrapper.cursor()
+
+        usable.assert_called_once()
+        self.assertEqual(self.connect.call_count, 1)
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    """test the benchmark_db_connections command."""
+
+    @skipUnless(isinstance(connection, base.DatabaseWrapper),
+                'needs the pooled postgresql backend')
+    def test_benchmark(self):
+        """test every setup is measured."""
+        out = StringIO()
+
+        call_command('benchmark_db_connections', '--requests', '20',
+                     '--host', 'testserver', stdout=out)
+
+        self.assertIn('new connection per request', out.getvalue())
+        self.assertIn('pool, health checks', out.getvalue())
+
+    @skipUnless(not isinstance(connection, base.DatabaseWrapper),
+                'needs another database backend')
+    def test_benchmark_other_backend(self):
+        """test the command refuses other database backends."""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_db_connections')
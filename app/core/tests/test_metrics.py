@@ -0,0 +1,180 @@
+"""
+tests for the request timings and metrics.
+"""
+import asyncio
+import json
+import os
+import re
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.middleware import ServerTimingMiddleware
+from core.models import Tag
+
+METRICS_URL = reverse('api_metrics')
+TAGS_URL = reverse('proguide:tag-list')
+
+
+def server_timing(response):
+    """return the Server-Timing header as {name: (duration, desc)}"""
+    timings = {}
+    for metric in response['Server-Timing'].split(', '):
+        name, *params = metric.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        timings[name] = (float(params['dur']), params.get('desc'))
+    return timings
+
+
+class ServerTimingTests(TestCase):
+    """test the Server-Timing header."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com', '12345678')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Tag.objects.create(user=self.user, name='pen')
+
+    def test_server_timing(self):
+        """test the header has the db, serializer, render and total time."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(TAGS_URL)
+
+        timings = server_timing(res)
+        self.assertEqual(
+            list(timings), ['db', 'serializer', 'render', 'total'])
+        self.assertEqual(timings['db'][1], f'"{len(queries)} queries"')
+        self.assertGreaterEqual(timings['total'][0], timings['db'][0])
+
+    def test_async_capable(self):
+        """test an ASGI chain stays async through the middleware."""
+        async def get_response(request):
+            return HttpResponse()
+        middleware = ServerTimingMiddleware(get_response)
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        res = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('total', server_timing(res))
+
+    def test_queries_outside_requests_not_counted(self):
+        """test only the queries of the request are counted."""
+        res = self.client.get(TAGS_URL)
+        Tag.objects.count()
+
+        self.assertEqual(server_timing(res)['db'][1], '"1 queries"')
+
+
+class MetricsTests(TestCase):
+    """test the metrics endpoint."""
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com', '12345678')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_staff_only(self):
+        """test the metrics are not public."""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(None)
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_metrics_per_route(self):
+        """test requests are counted per route, not per url."""
+        self.user.is_staff = True
+        self.user.save()
+        tag = Tag.objects.create(user=self.user, name='pen')
+        detail = reverse('proguide:tag-detail', args=[tag.id])
+
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+        self.client.patch(detail, {'name': 'pencil'})
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        text = res.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn(
+            'http_requests_total{route="proguide:tag-list",method="GET",'
+            'status="200"} 2', text)
+        self.assertIn(
+            'http_requests_total{route="proguide:tag-detail",method="PATCH",'
+            'status="200"} 1', text)
+        self.assertIn(
+            'http_request_duration_seconds_count{route="proguide:tag-list",'
+            'method="GET"} 2', text)
+        self.assertRegex(
+            text, r'http_request_db_queries_total\{route="proguide:tag-list",'
+                  r'method="GET"\} [1-9]')
+
+    def test_histogram_buckets(self):
+        """test the buckets count the requests at most their bound."""
+        for total in (0.003, 0.07, 20):
+            timings = metrics.RequestTimings()
+            timings.total = total
+            metrics.registry.observe('route', 'GET', 200, timings)
+
+        text = metrics.render_metrics(metrics.registry.snapshot())
+
+        buckets = dict(re.findall(
+            r'http_request_duration_seconds_bucket\{.*le="([^"]+)"\} (\d+)',
+            text))
+        self.assertEqual(buckets['0.005'], '1')
+        self.assertEqual(buckets['0.05'], '1')
+        self.assertEqual(buckets['0.1'], '2')
+        self.assertEqual(buckets['10.0'], '2')
+        self.assertEqual(buckets['+Inf'], '3')
+        self.assertIn(
+            'http_request_duration_seconds_sum{route="route",method="GET"} '
+            '20.073', text)
+
+    def test_workers_summed(self):
+        """test the metrics files of every worker are added up."""
+        with tempfile.TemporaryDirectory() as directory:
+            series = [['http_requests_total',
+                       [['route', 'r'], ['method', 'GET'], ['status', '200']],
+                       2]]
+            for worker in ('1-a', '2-b'):
+                path = os.path.join(directory, f'{worker}.json')
+                with open(path, 'w') as metrics_file:
+                    json.dump(series, metrics_file)
+
+            with override_settings(METRICS={'DIR': directory,
+                                            'FLUSH_INTERVAL': 60}):
+                text = metrics.render_metrics(metrics.collect())
+
+        self.assertIn(
+            'http_requests_total{route="r",method="GET",status="200"} 4',
+            text)
+
+    def test_worker_writes_its_file(self):
+        """test a worker flushes its metrics to the shared directory."""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS={'DIR': directory,
+                                           'FLUSH_INTERVAL': 60}):
+            registry = metrics.Registry()
+            timings = metrics.RequestTimings()
+            timings.total = 0.01
+            registry.observe('route', 'GET', 200, timings)
+
+            registry.flush()
+
+            files = os.listdir(directory)
+            self.assertEqual(len(files), 1)
+            self.assertTrue(files[0].startswith(f'{os.getpid()}-'))
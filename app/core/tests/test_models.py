@@ -3,6 +3,7 @@ test for models.
 """
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 
 from core.models import ProGuide, Tag, Ingredient, proguide_image_file_path
 
@@ -94,6 +95,21 @@ class ModelsTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_names_unique_per_user_ignoring_case(self):
+        """test a user can't have two tags differing only in case"""
+        user = create_user()
+        other = create_user(email='hameddjf01@gmail.com')
+        Tag.objects.create(user=user, name='Vegan')
+        Tag.objects.create(user=other, name='vegan')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(user=user, name='vegan')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Ingredient.objects.bulk_create([
+                Ingredient(user=user, name='Salt'),
+                Ingredient(user=user, name='SALT'),
+            ])
+
     """
     (mock object) با یک شیئ جعلی uuid4 برای جایگزینی موقت تابع @patch بوسیله
     منحصر بفرد رو شبیه سازی کنه تا uuid می‌سازیم تا هنگام تست، یک
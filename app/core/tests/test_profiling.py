@@ -0,0 +1,114 @@
+"""
+tests for the profiling of staff requests.
+"""
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import ProGuide, Tag
+
+PROGUIDES_URL = reverse('proguide:proguide-list')
+
+
+class ProfilingTests(TestCase):
+    """test the profiling middleware."""
+
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            'admin@example.com', '12345678', is_staff=True)
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com', '12345678')
+        for user in (self.staff, self.user):
+            proguide = ProGuide.objects.create(
+                user=user, title='sample', time_minutes=5,
+                price=Decimal('1.50'),
+            )
+            proguide.tags.add(Tag.objects.create(user=user, name='tag'))
+        self.client = APIClient()
+
+    def _token_client(self, user):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+    def test_staff_cprofile_report(self):
+        """test a staff token gets the stats and queries of the request."""
+        self._token_client(self.staff)
+
+        res = self.client.get(PROGUIDES_URL, {'profile': '1'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Profiled-Status'], '200')
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        report = res.content.decode()
+        self.assertIn('GET /api/proguide/proguides/?profile=1 -> 200', report)
+        self.assertRegex(report, r'db [\d.]+ ms in \d+ queries')
+        self.assertIn('"core_proguide"', report)
+        self.assertIn('cumulative', report)
+        self.assertIn('proguide/views.py', report)
+
+    def test_staff_session_header(self):
+        """test a staff session can ask with the header."""
+        self.client.force_login(self.staff)
+
+        res = self.client.get(PROGUIDES_URL, HTTP_X_PROFILE='cprofile')
+
+        self.assertIn('cumulative', res.content.decode())
+
+    @override_settings(PROFILING={'ENABLED': True, 'INTERVAL': 0.0001,
+                                  'LIMIT': 10})
+    def test_stacks(self):
+        """test the folded stacks format."""
+        self._token_client(self.staff)
+
+        res = self.client.get(PROGUIDES_URL, {'profile': 'stacks'})
+
+        lines = res.content.decode().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertRegex(line, r'^\S.*;.* \d+$')
+
+    def test_not_staff(self):
+        """test other users get the normal response."""
+        self._token_client(self.user)
+
+        res = self.client.get(PROGUIDES_URL, {'profile': '1'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profiled-Status', res)
+        self.assertEqual(res.data['results'][0]['title'], 'sample')
+
+    def test_anonymous_and_bad_token(self):
+        """test unauthenticated requests are not profiled."""
+        res = self.client.get(PROGUIDES_URL, {'profile': '1'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+        res = self.client.get(PROGUIDES_URL, {'profile': '1'})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unknown_mode(self):
+        """test other values of the parameter are ignored."""
+        self._token_client(self.staff)
+
+        res = self.client.get(PROGUIDES_URL, {'profile': '0'})
+
+        self.assertNotIn('X-Profiled-Status', res)
+
+    async def test_async_chain(self):
+        """test staff requests are profiled through an async chain."""
+        token = await sync_to_async(Token.objects.create)(user=self.staff)
+        client = AsyncClient()
+
+        res = await client.get(PROGUIDES_URL, {'profile': '1'},
+                               authorization=f'Token {token.key}')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Profiled-Status'], '200')
+        self.assertIn('proguide/views.py', res.content.decode())
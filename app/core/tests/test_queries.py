@@ -0,0 +1,131 @@
+"""
+tests for the slow and repeated query detection.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.middleware import QueryInspectionMiddleware, ServerTimingMiddleware
+from core.models import ProGuide, Tag
+from core.queries import normalize
+from proguide.views import ProGuideViewSet
+
+PROGUIDES_URL = reverse('proguide:proguide-list')
+
+
+def inspection(**options):
+    """override the query inspection settings"""
+    return override_settings(QUERY_INSPECTION={
+        **settings.QUERY_INSPECTION,
+        'ENABLED': True, 'SAMPLE_RATE': 1.0, **options,
+    })
+
+
+class NormalizeTests(SimpleTestCase):
+    """test query shapes."""
+
+    def test_lists_collapsed(self):
+        """test lists of any length have the same shape."""
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            normalize('SELECT *  FROM t WHERE id IN (%s)  LIMIT 3'),
+        )
+
+    def test_bulk_values_collapsed(self):
+        """test multi-row inserts have the same shape."""
+        self.assertEqual(
+            normalize('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+            normalize('INSERT INTO t (a, b) VALUES (%s, %s)'),
+        )
+
+
+class QueryInspectionTests(TestCase):
+    """test the query inspection middleware."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com', '12345678')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            proguide = ProGuide.objects.create(
+                user=self.user, title=f'object {i}', time_minutes=5,
+                price=Decimal('1.50'),
+            )
+            proguide.tags.add(
+                Tag.objects.create(user=self.user, name=f'tag {i}'))
+
+    def _list_without_prefetch(self):
+        with patch.object(ProGuideViewSet, 'fast_list', False), \
+                patch('proguide.views.nested_prefetches', return_value=[]):
+            self.client.get(PROGUIDES_URL)
+
+    def test_repeated_query_logged(self):
+        """test an N+1 is logged with its route and serializer field."""
+        with inspection(REPEAT_THRESHOLD=5), \
+                self.assertLogs('core.queries', 'WARNING') as logs:
+            self._list_without_prefetch()
+
+        repeated = [line for line in logs.output if 'repeated query' in line]
+        self.assertEqual(len(repeated), 2)
+        self.assertIn('(5 times) on proguide:proguide-list', repeated[0])
+        self.assertIn('ProGuideSerializer.tags', ''.join(repeated))
+        self.assertIn('"core_proguide_tags"."proguide_id" = %s',
+                      ''.join(repeated))
+
+    def test_prefetched_list_not_logged(self):
+        """test the prefetched list runs no repeated query."""
+        with inspection(REPEAT_THRESHOLD=3), \
+                self.assertNoLogs('core.queries', 'WARNING'):
+            self.client.get(PROGUIDES_URL)
+            with patch.object(ProGuideViewSet, 'fast_list', False):
+                self.client.get(PROGUIDES_URL)
+
+    def test_slow_query_logged(self):
+        """test queries above the threshold are logged."""
+        with inspection(SLOW_MS=0), \
+                self.assertLogs('core.queries', 'WARNING') as logs:
+            self.client.get(PROGUIDES_URL)
+
+        self.assertIn('slow query', logs.output[0])
+        self.assertIn('on proguide:proguide-list at proguide/', logs.output[0])
+
+    def test_sampling(self):
+        """test requests out of the sample are not inspected."""
+        with inspection(SAMPLE_RATE=0, SLOW_MS=0), \
+                self.assertNoLogs('core.queries', 'WARNING'):
+            self._list_without_prefetch()
+
+    def test_disabled(self):
+        """test nothing is inspected unless enabled."""
+        with inspection(ENABLED=False, SLOW_MS=0), \
+                self.assertNoLogs('core.queries', 'WARNING'):
+            self._list_without_prefetch()
+
+    def test_async_chain(self):
+        """test the queries of an ASGI request are inspected."""
+        async def view(request):
+            await sync_to_async(Tag.objects.count)()
+            return HttpResponse()
+
+        with inspection(SLOW_MS=0), \
+                self.assertLogs('core.queries', 'WARNING') as logs:
+            middleware = ServerTimingMiddleware(
+                QueryInspectionMiddleware(view))
+            async_to_sync(middleware)(RequestFactory().get('/'))
+
+        self.assertIn('slow query', logs.output[0])
+        self.assertIn('"core_tag"', logs.output[0])
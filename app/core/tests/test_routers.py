@@ -0,0 +1,82 @@
+"""
+tests for the replica database router.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import SimpleTestCase
+
+from core import routers
+from core.models import ProGuide
+
+
+@patch('core.routers.replica_configured', return_value=True)
+class ReplicaRouterTests(SimpleTestCase):
+    """test routing reads to the replica."""
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def test_reads_on_primary_by_default(self, patched_configured):
+        """test reads outside a replica block use the default database."""
+        self.assertIsNone(self.router.db_for_read(ProGuide))
+
+        with routers.replica_reads():
+            self.assertIsNone(self.router.db_for_read(ProGuide))
+
+    def test_reads_on_replica(self, patched_configured):
+        """test reads go to the replica once enabled."""
+        with routers.replica_reads():
+            routers.use_replica()
+
+            self.assertEqual(self.router.db_for_read(ProGuide), 'replica')
+
+        self.assertIsNone(self.router.db_for_read(ProGuide))
+
+    def test_reads_after_write_on_primary(self, patched_configured):
+        """test a write sends the following reads to the primary."""
+        with routers.replica_reads():
+            routers.use_replica()
+
+            self.assertEqual(self.router.db_for_write(ProGuide), 'default')
+
+            self.assertTrue(routers.wrote())
+            self.assertIsNone(self.router.db_for_read(ProGuide))
+
+        self.assertFalse(routers.wrote())
+
+    def test_reads_in_transaction_on_primary(self, patched_configured):
+        """test reads inside a transaction of the primary stay on it."""
+        with routers.replica_reads(), \
+                patch.object(connections['default'], 'in_atomic_block', True):
+            routers.use_replica()
+
+            self.assertIsNone(self.router.db_for_read(ProGuide))
+
+    def test_related_reads_follow_instance(self, patched_configured):
+        """test related objects are read where the instance was read."""
+        user = get_user_model()(email='user@example.com')
+        user._state.db = 'default'
+
+        with routers.replica_reads():
+            routers.use_replica()
+
+            self.assertEqual(
+                self.router.db_for_read(ProGuide, instance=user), 'default')
+
+    def test_no_replica_configured(self, patched_configured):
+        """test reads stay on the primary without a replica."""
+        patched_configured.return_value = False
+
+        with routers.replica_reads():
+            routers.use_replica()
+
+            self.assertIsNone(self.router.db_for_read(ProGuide))
+
+    def test_allow_relation(self, patched_configured):
+        """test objects of the primary and the replica can be related."""
+        primary, replica = ProGuide(), ProGuide()
+        primary._state.db, replica._state.db = 'default', 'replica'
+
+        self.assertTrue(self.router.allow_relation(primary, replica))
@@ -0,0 +1,112 @@
+"""
+tests for the precomputed OpenAPI schema.
+"""
+import gzip
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from app import schema
+
+SCHEMA_URL = reverse('api_schema')
+
+
+class SchemaViewTests(SimpleTestCase):
+    """test serving the schema."""
+
+    def setUp(self):
+        schema.set_schema(None)
+        self.addCleanup(schema.set_schema, None)
+
+    def test_schema_generated_once(self):
+        """test the schema is built on the first request only."""
+        with patch('app.schema.build', wraps=schema.build) as build:
+            first = self.client.get(SCHEMA_URL)
+            second = self.client.get(SCHEMA_URL)
+
+        build.assert_called_once()
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b'openapi:', first.content)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_not_modified(self):
+        """test a known ETag gets a 304 without a body."""
+        etag = self.client.get(SCHEMA_URL)['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    def test_gzip(self):
+        """test the schema is sent gzipped when accepted."""
+        plain = self.client.get(SCHEMA_URL)
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+
+    def test_gzip_not_modified(self):
+        """test the gzipped ETag only matches gzipped requests."""
+        etag = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip',
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+
+    def test_json_format(self):
+        """test the json schema has its own body and ETag."""
+        yaml_res = self.client.get(SCHEMA_URL)
+
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'],
+                         'application/vnd.oai.openapi+json')
+        self.assertIn('openapi', res.json())
+        self.assertNotEqual(res['ETag'], yaml_res['ETag'])
+
+    def test_schema_read_from_files(self):
+        """test the schema files are served instead of building it."""
+        with tempfile.TemporaryDirectory() as directory:
+            schema.write(schema.build(), directory)
+            with override_settings(SCHEMA_CACHE_DIR=directory), \
+                    patch('app.schema.build') as build:
+                res = self.client.get(SCHEMA_URL)
+
+        build.assert_not_called()
+        self.assertIn(b'openapi:', res.content)
+
+
+class GenerateSchemaCommandTests(SimpleTestCase):
+    """test the generate_schema command."""
+
+    def test_generate_schema(self):
+        """test the command writes every format."""
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('generate_schema', '--dir', directory,
+                         stdout=StringIO())
+
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['schema.json', 'schema.yaml'])
+            self.assertIsNotNone(schema.read(directory))
+
+    def test_generate_schema_without_dir(self):
+        """test the command needs an output directory."""
+        with override_settings(SCHEMA_CACHE_DIR=''):
+            with self.assertRaises(CommandError):
+                call_command('generate_schema', '--dir', '')
@@ -0,0 +1,27 @@
+"""
+views for the core apis.
+"""
+from django.http import HttpResponse
+
+from drf_spectacular.utils import extend_schema
+
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
+
+from core import metrics
+from user.authentication import CachedTokenAuthentication
+
+
+class MetricsView(APIView):
+    """request metrics of every worker, prometheus text format"""
+    authentication_classes = [CachedTokenAuthentication,
+                              SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses={(200, 'text/plain'): str})
+    def get(self, request):
+        return HttpResponse(
+            metrics.render_metrics(metrics.collect()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
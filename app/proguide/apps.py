@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ProguideConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'proguide'
+
+    def ready(self):
+        # connect the cache invalidation and updated_at signals
+        import proguide.cache  # noqa: F401
+        import proguide.conditional  # noqa: F401
@@ -0,0 +1,88 @@
+"""
+async (ASGI) entry points for the proguide apis.
+
+a uwsgi worker serves one request per thread, so a slow database caps
+the whole site at workers x threads concurrent requests. under ASGI the
+event loop keeps accepting requests instead, and the wrapped views below
+run safe (read) requests in a shared thread pool: up to
+ASGI_READ_THREADS reads wait on the database at the same time, each
+pool thread holding at most one connection.
+writes keep django's default handling.
+
+django 4.0 has no async orm interface yet, the pool threads use the sync
+orm through sync_to_async.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+from rest_framework.permissions import SAFE_METHODS
+
+from core import metrics
+
+_executor = None
+
+
+def get_executor():
+    """return the thread pool running async reads"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASGI_READ_THREADS,
+            thread_name_prefix='asgi-read',
+        )
+    return _executor
+
+
+def _run_read(view, request, *args, **kwargs):
+    """run a view to a rendered response on a pool thread"""
+    # pool threads see no request_started/finished, manage the
+    # thread's connection like django does around a request
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            with metrics.timed('render'):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """wrap a sync view callback into an async view for ASGI"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await sync_to_async(
+                _run_read, thread_sensitive=False, executor=get_executor(),
+            )(view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_urlpatterns(patterns):
+    """copy url patterns with every view wrapped by async_read_view"""
+    wrapped = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            wrapped.append(URLResolver(
+                pattern.pattern,
+                async_urlpatterns(pattern.url_patterns),
+                pattern.default_kwargs,
+                pattern.app_name,
+                pattern.namespace,
+            ))
+        else:
+            wrapped.append(URLPattern(
+                pattern.pattern,
+                async_read_view(pattern.callback),
+                pattern.default_args,
+                pattern.name,
+            ))
+    return wrapped
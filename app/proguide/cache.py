@@ -0,0 +1,162 @@
+"""
+per-user versioned response cache for the proguide apis.
+
+every cached response key carries the user's current version number,
+any write touching the user's proguides, tags or ingredients bumps it,
+so stale entries are never read again and just expire.
+
+the versions only work when every worker sees them: responses are not
+cached unless PROGUIDE_CACHE['ALIAS'] is a shared backend, or LOCAL
+allows a per-process one (a single process: runserver, tests).
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import ProGuide, Tag, Ingredient
+
+
+def get_cache():
+    """return the cache holding versions and responses"""
+    return caches[settings.PROGUIDE_CACHE['ALIAS']]
+
+
+def is_shared():
+    """whether the versions are seen by every worker of every server"""
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def caching_enabled():
+    """whether responses (and validators built on versions) can be reused"""
+    return is_shared() or settings.PROGUIDE_CACHE['LOCAL']
+
+
+def _version_key(user_id):
+    return f'proguide:version:{user_id}'
+
+
+def get_version(user_id):
+    """return the current cache version of a user"""
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so a lost version is never handed out again
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    """invalidate every cached response of a user"""
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+# users to invalidate at the end of deferred_invalidation(), else None
+_deferred = ContextVar('deferred_invalidation', default=None)
+
+
+def invalidate_user(user_id):
+    """
+    bump the user's version now and again once the transaction commits,
+    so a response cached from not yet committed data is dropped too.
+    """
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred.add(user_id)
+        return
+    bump_version(user_id)
+    transaction.on_commit(lambda: bump_version(user_id))
+
+
+@contextmanager
+def deferred_invalidation():
+    """
+    invalidate every user once at the end of the block, instead of once
+    per row signal (e.g. queryset.delete() of many proguides).
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+    users = set()
+    token = _deferred.set(users)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+        for user_id in users:
+            invalidate_user(user_id)
+
+
+def response_cache_key(request):
+    """build the cache key for a request: user, version, url and params"""
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    raw = f'{request.build_absolute_uri(request.path)}?{params}'
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    version = get_version(request.user.pk)
+    return f'proguide:response:{request.user.pk}:{version}:{digest}'
+
+
+class CachedListMixin:
+    """serve list responses from the per-user versioned cache"""
+
+    def list(self, request, *args, **kwargs):
+        if not caching_enabled():
+            return super().list(request, *args, **kwargs)
+        cache = get_cache()
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data,
+                      settings.PROGUIDE_CACHE['TIMEOUT'])
+        return response
+
+
+@receiver(post_save, sender=ProGuide)
+@receiver(post_delete, sender=ProGuide)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def proguide_data_changed(sender, instance, **kwargs):
+    """invalidate the owner's cached responses"""
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_created(sender, instance, created, **kwargs):
+    """start new users on a fresh version, in case their id was reused"""
+    if created:
+        bump_version(instance.pk)
+
+
+@receiver(m2m_changed, sender=ProGuide.tags.through)
+@receiver(m2m_changed, sender=ProGuide.ingredients.through)
+def proguide_relations_changed(sender, instance, action, **kwargs):
+    """invalidate the owner's cached responses on tag/ingredient links"""
+    if action.startswith('post_'):
+        invalidate_user(instance.user_id)
@@ -0,0 +1,122 @@
+"""
+conditional GET (ETag / Last-Modified) support for proguide apis.
+
+validators come from cheap metadata only, `ProGuide.updated_at` for a
+single proguide and the per-user cache version for lists, so a request
+answered with 304 never runs the serializer. lists only get validators
+when the versions are shared by the workers (proguide.cache).
+"""
+import hashlib
+from calendar import timegm
+
+from django.core.exceptions import ValidationError
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+    quote_etag,
+)
+from django.utils.http import http_date
+
+from rest_framework import status
+
+from core.models import ProGuide, Tag, Ingredient
+from proguide.cache import caching_enabled, response_cache_key
+
+
+def _make_etag(value):
+    return quote_etag(hashlib.sha1(value.encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """answer list/retrieve with 304 when the client copy is current"""
+
+    def _conditional(self, request, etag, last_modified, get_response):
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified,
+        )
+        if response is None:
+            response = get_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # validators are per user, always revalidate
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            updated_at = self.get_queryset().prefetch_related(None).filter(
+                pk=lookup,
+            ).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            # not a valid id, like get_object_or_404
+            updated_at = None
+        if updated_at is None:
+            # not found, let the view build the 404
+            return super().retrieve(request, *args, **kwargs)
+
+        return self._conditional(
+            request,
+            etag=_make_etag(f'{lookup}:{updated_at.isoformat()}'),
+            last_modified=timegm(updated_at.utctimetuple()),
+            get_response=lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs),
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not caching_enabled():
+            # a worker missing the version bump would answer 304
+            return super().list(request, *args, **kwargs)
+        # the response cache key already holds user, version and params
+        return self._conditional(
+            request,
+            etag=_make_etag(response_cache_key(request)),
+            last_modified=None,
+            get_response=lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs),
+        )
+
+
+def touch_proguides(**filters):
+    """bump updated_at of proguides whose nested data changed"""
+    ProGuide.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, created=False, **kwargs):
+    """a renamed or deleted tag changes every proguide showing it"""
+    if not created:
+        touch_proguides(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, created=False, **kwargs):
+    """a renamed or deleted ingredient changes every proguide showing it"""
+    if not created:
+        touch_proguides(ingredients=instance)
+
+
+@receiver(m2m_changed, sender=ProGuide.tags.through)
+@receiver(m2m_changed, sender=ProGuide.ingredients.through)
+def relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """links changed through the orm related managers"""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        touch_proguides(pk=instance.pk)
+    elif pk_set:
+        touch_proguides(pk__in=pk_set)
+    elif action == 'post_clear':
+        # pk_set is not sent for clear(), the links are gone by now
+        touch_proguides(user_id=instance.user_id)
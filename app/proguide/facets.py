@@ -0,0 +1,45 @@
+"""
+tag and ingredient facet counts for a filtered set of proguides.
+"""
+from django.db.models import CharField, Count, F, Value
+
+from core.models import ProGuide
+
+RELATIONS = ('tags', 'ingredients')
+
+
+def _relation_counts(field_name, proguide_ids):
+    """grouped (id, name, count) rows of one relation, tagged by kind"""
+    field = ProGuide._meta.get_field(field_name)
+    target = field.m2m_reverse_field_name()
+    return field.remote_field.through.objects.filter(
+        proguide_id__in=proguide_ids,
+    ).values(
+        facet_id=F(f'{target}_id'), name=F(f'{target}__name'),
+    ).annotate(
+        count=Count('proguide_id'),
+        kind=Value(field_name, output_field=CharField()),
+    ).order_by()
+
+
+def facet_counts(queryset):
+    """
+    count the proguides of `queryset` per tag and per ingredient in one
+    aggregated query over the through tables.
+    returns {'tags': [{id, name, count}], 'ingredients': [...]}, busiest
+    first; items used by none of the proguides are left out.
+    """
+    proguide_ids = queryset.order_by().values('pk')
+    first, *rest = (
+        _relation_counts(field_name, proguide_ids)
+        for field_name in RELATIONS
+    )
+    rows = first.union(*rest, all=True).order_by('kind', '-count', 'name')
+
+    facets = {field_name: [] for field_name in RELATIONS}
+    for row in rows:
+        facets[row['kind']].append({
+            'id': row['facet_id'], 'name': row['name'],
+            'count': row['count'],
+        })
+    return facets
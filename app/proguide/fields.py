@@ -0,0 +1,59 @@
+"""serializer fields for proguide apis"""
+import warnings
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import serializers
+
+from PIL import Image
+
+
+class HeaderValidatedImageField(serializers.ImageField):
+    """
+    image field validated from the file header only.
+    format and dimensions are read without decoding any pixel data, so
+    an oversized image (decompression bomb) is rejected before anything
+    is decoded, and memory use doesn't depend on the upload size.
+    """
+    default_error_messages = {
+        'invalid_image': _('فایل ارسال شده تصویر معتبری نیست.'),
+        'invalid_format': _('فرمت تصویر {format} پشتیبانی نمی‌شود.'),
+        'too_many_pixels': _(
+            'ابعاد تصویر بیش از حد مجاز ({max_pixels} پیکسل) است.'),
+        'too_large': _('حجم فایل بیش از حد مجاز ({max_bytes} بایت) است.'),
+    }
+
+    def to_internal_value(self, data):
+        # FileField checks only, ImageField would verify the whole image
+        file_object = serializers.FileField.to_internal_value(self, data)
+        limits = settings.PROGUIDE_IMAGE_LIMITS
+        if file_object.size > limits['MAX_BYTES']:
+            self.fail('too_large', max_bytes=limits['MAX_BYTES'])
+
+        # uploads are streamed to a temporary file, open it by path
+        if hasattr(file_object, 'temporary_file_path'):
+            source = file_object.temporary_file_path()
+        else:
+            source = file_object
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', Image.DecompressionBombWarning)
+                # lazy: parses the header, pixel data is never loaded
+                with Image.open(source) as image:
+                    image_format = image.format
+                    width, height = image.size
+        except (Image.DecompressionBombError,
+                Image.DecompressionBombWarning):
+            self.fail('too_many_pixels', max_pixels=limits['MAX_PIXELS'])
+        except Exception:
+            self.fail('invalid_image')
+
+        if image_format not in limits['FORMATS']:
+            self.fail('invalid_format', format=image_format)
+        if width * height > limits['MAX_PIXELS']:
+            self.fail('too_many_pixels', max_pixels=limits['MAX_PIXELS'])
+
+        file_object.content_type = Image.MIME.get(image_format)
+        file_object.seek(0)
+        return file_object
@@ -0,0 +1,154 @@
+"""
+background generation of proguide image variants.
+
+uploads only store the original and queue a ProGuideImageJob row, the
+`process_image_jobs` worker picks jobs from the database (no broker),
+writes resized jpeg copies next to the original and records their paths
+in `ProGuide.image_variants`.
+"""
+import os
+import time
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from PIL import Image, ImageOps
+
+from core.models import ProGuide, ProGuideImageJob
+from proguide.cache import invalidate_user
+
+
+# name -> (max width, max height, jpeg quality)
+VARIANTS = {
+    'thumbnail': (150, 150, 80),
+    'medium': (600, 600, 82),
+    'web': (1280, 1280, 82),
+}
+MAX_ATTEMPTS = 3
+# processing jobs not updated for this long belong to a dead worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+def variant_urls(proguide, request=None):
+    """return {variant: url} for the ready variants of a proguide"""
+    urls = {}
+    for name, path in (proguide.image_variants or {}).items():
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def enqueue(proguide):
+    """queue variant generation for the proguide's current image"""
+    # variants of the replaced image are useless now
+    for path in (proguide.image_variants or {}).values():
+        default_storage.delete(path)
+    ProGuide.objects.filter(pk=proguide.pk).update(image_variants={})
+    proguide.image_variants = {}
+    return ProGuideImageJob.objects.create(
+        proguide=proguide, image=proguide.image.name,
+    )
+
+
+def generate_variants(image_name):
+    """write every variant of an image, return {variant: storage path}"""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    largest = max((w, h) for w, h, quality in VARIANTS.values())
+    paths = {}
+    with default_storage.open(image_name) as image_file:
+        with Image.open(image_file) as image:
+            # let the jpeg decoder scale down while decoding
+            image.draft('RGB', largest)
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            for name, (width, height, quality) in VARIANTS.items():
+                variant = image.copy()
+                variant.thumbnail((width, height), Image.Resampling.LANCZOS)
+                buffer = BytesIO()
+                variant.save(buffer, format='JPEG', quality=quality,
+                             optimize=True, progressive=True)
+                paths[name] = default_storage.save(
+                    os.path.join('uploads', 'proguide', 'variants',
+                                 f'{stem}_{name}.jpg'),
+                    ContentFile(buffer.getvalue()),
+                )
+    return paths
+
+
+def claim_job():
+    """mark the oldest pending job as processing and return it"""
+    with transaction.atomic():
+        job = ProGuideImageJob.objects.select_for_update(
+            skip_locked=True,
+        ).filter(
+            status=ProGuideImageJob.PENDING,
+        ).order_by('created_at').first()
+        if job is None:
+            return None
+        job.status = ProGuideImageJob.PROCESSING
+        job.attempts += 1
+        job.save(update_fields=['status', 'attempts', 'updated_at'])
+    return job
+
+
+def process_job(job):
+    """generate the variants of a claimed job and record them"""
+    try:
+        paths = generate_variants(job.image)
+    except Exception as error:
+        job.error = repr(error)
+        job.status = (ProGuideImageJob.FAILED
+                      if job.attempts >= MAX_ATTEMPTS
+                      else ProGuideImageJob.PENDING)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        return False
+
+    proguide = ProGuide.objects.filter(
+        pk=job.proguide_id, image=job.image,
+    ).first()
+    if proguide is not None:
+        ProGuide.objects.filter(
+            pk=proguide.pk, image=job.image,
+        ).update(image_variants=paths, updated_at=timezone.now())
+        # a retried job may have written variants already
+        for path in (proguide.image_variants or {}).values():
+            if path not in paths.values():
+                default_storage.delete(path)
+        invalidate_user(proguide.user_id)
+    else:
+        # proguide deleted or given a newer image meanwhile
+        for path in paths.values():
+            default_storage.delete(path)
+
+    job.status = ProGuideImageJob.DONE
+    job.error = ''
+    job.save(update_fields=['status', 'error', 'updated_at'])
+    return True
+
+
+def requeue_stale_jobs():
+    """give jobs left in processing by a dead worker another try"""
+    return ProGuideImageJob.objects.filter(
+        status=ProGuideImageJob.PROCESSING,
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status=ProGuideImageJob.PENDING)
+
+
+def run_worker(poll_interval=1.0, once=False):
+    """process jobs until stopped, or until the queue is empty if once"""
+    processed = 0
+    requeue_stale_jobs()
+    while True:
+        job = claim_job()
+        if job is not None:
+            process_job(job)
+            processed += 1
+        elif once:
+            return processed
+        else:
+            time.sleep(poll_interval)
+            # drop connections broken or expired while idling
+            close_old_connections()
@@ -0,0 +1,404 @@
+"""
+django command benchmarking the proguide api through the django test
+client: latency percentiles, queries per request and throughput of list,
+filter, detail, create, update and image-upload requests on a seeded
+dataset, written as json and checked against thresholds or a baseline.
+
+the default thresholds (proguide/benchmark_thresholds.json) only bound
+the queries per request of the endpoints: every user sends a request
+before measuring and the token cache keeps them for the whole run, so
+the token lookup is not counted. they hold for the default options on a
+database outside a test transaction (savepoints add queries there).
+compare latencies and throughput to the results of a previous run on
+the same machine with --baseline.
+"""
+import json
+import math
+import platform
+import random
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from core.models import ProGuide, Tag, Ingredient
+from proguide.serializers import BATCH_SIZE
+
+THRESHOLDS = settings.BASE_DIR / 'proguide' / 'benchmark_thresholds.json'
+
+SCENARIOS = ['list', 'filter', 'detail', 'create', 'update', 'image-upload']
+
+PERCENTILES = (50, 90, 95, 99)
+
+# metrics where a higher value is better, the others are upper bounds
+HIGHER_IS_BETTER = {'throughput_rps'}
+# metrics compared to the baseline (max and p99 are single outliers),
+# query counts without tolerance
+BASELINE_METRICS = {'p50_ms', 'p95_ms', 'mean_ms', 'throughput_rps',
+                    'queries_mean', 'queries_max'}
+EXACT = {'queries_mean', 'queries_max'}
+
+WORDS = (
+    'quick easy spicy sweet vegan grilled baked fresh classic crispy '
+    'creamy smoky lemon garlic herb summer winter family weekend rustic'
+).split()
+
+
+def percentile(values, percent):
+    """return the nearest-rank percentile of a non empty list"""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def db_timing(response):
+    """return (queries, seconds) from the Server-Timing header"""
+    for metric in response.get('Server-Timing', '').split(', '):
+        name, *params = metric.split(';')
+        if name == 'db':
+            params = dict(param.split('=', 1) for param in params)
+            return (int(params['desc'].strip('"').split()[0]),
+                    float(params['dur']) / 1000)
+    return 0, 0.0
+
+
+def check(results, thresholds=None, baseline=None, tolerance=0.0):
+    """return a message for every metric that regressed"""
+    failures = []
+    for scenario, limits in (thresholds or {}).items():
+        measured = results.get(scenario)
+        if measured is None:
+            continue
+        for metric, limit in limits.items():
+            value = measured[metric]
+            if metric in HIGHER_IS_BETTER:
+                failed = value < limit
+            else:
+                failed = value > limit
+            if failed:
+                failures.append(
+                    f'{scenario} {metric}: {value:g} (threshold {limit:g})')
+
+    for scenario, previous in (baseline or {}).items():
+        measured = results.get(scenario)
+        if measured is None:
+            continue
+        for metric, before in previous.items():
+            value = measured.get(metric)
+            if value is None or metric not in BASELINE_METRICS:
+                continue
+            if metric in EXACT:
+                failed = value > before
+            elif metric in HIGHER_IS_BETTER:
+                failed = value < before / (1 + tolerance)
+            else:
+                failed = value > before * (1 + tolerance)
+            if failed:
+                failures.append(
+                    f'{scenario} {metric}: {value:g} (baseline {before:g})')
+    return failures
+
+
+class Command(BaseCommand):
+    "django command to benchmark the proguide api"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='users seeded, requests are spread over them',
+        )
+        parser.add_argument(
+            '--proguides', type=int, default=100,
+            help='proguides seeded per user',
+        )
+        parser.add_argument(
+            '--tags', type=int, default=3,
+            help='tags and ingredients linked to every proguide',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='measured requests per scenario',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='requests per scenario sent before measuring, at least '
+                 'one per user',
+        )
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS,
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='seed of the dataset and of the requests sent',
+        )
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='keep the proguide response cache (off: every list '
+                 'request reaches the database)',
+        )
+        parser.add_argument(
+            '--output', help='write the results to this json file',
+        )
+        parser.add_argument(
+            '--thresholds',
+            default=THRESHOLDS,
+            help='json file of {scenario: {metric: limit}}, fail above '
+                 'the limits (below for throughput_rps), empty: none',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='results file of a previous run, fail when a metric is '
+                 'worse by more than --tolerance',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='allowed slow down against the baseline (0.2: 20%%), '
+                 'query counts must not grow at all',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header sent, must be in ALLOWED_HOSTS',
+        )
+
+    def handle(self, *args, **options):
+        """ entrypoint for command. """
+        thresholds = self._load(options['thresholds'])
+        baseline = self._load(options['baseline'])
+        if baseline is not None:
+            baseline = baseline['scenarios']
+
+        self.rng = random.Random(options['seed'])
+        self.client = APIClient(HTTP_HOST=options['host'])
+        # one process: a locmem cache is fine here
+        cache_settings = {**settings.PROGUIDE_CACHE, 'LOCAL': True}
+        if not options['cache']:
+            cache_settings['TIMEOUT'] = 0
+
+        # tokens resolved in the warm-up stay cached until the end, the
+        # measured queries are the endpoint's own
+        token_settings = {
+            **settings.TOKEN_AUTH_CACHE,
+            'MAX_SIZE': max(settings.TOKEN_AUTH_CACHE['MAX_SIZE'],
+                            options['users']),
+            'TTL': 24 * 60 * 60,
+        }
+
+        users = self._seed(options)
+        try:
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root,
+                                      PROGUIDE_CACHE=cache_settings,
+                                      TOKEN_AUTH_CACHE=token_settings):
+                results = {}
+                for scenario in options['scenarios']:
+                    results[scenario] = self._run(scenario, users, options)
+                    self._report(scenario, results[scenario])
+        finally:
+            get_user_model().objects.filter(
+                pk__in=[user.pk for user, _, _ in users]).delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(self._document(results, options), output, indent=2)
+
+        failures = check(results, thresholds, baseline, options['tolerance'])
+        if failures:
+            raise CommandError('regressions:\n' + '\n'.join(failures))
+
+    def _load(self, path):
+        if not path:
+            return None
+        try:
+            with open(path) as source:
+                return json.load(source)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'{path}: {error}')
+
+    def _seed(self, options):
+        """create users with tokens, tags, ingredients and proguides"""
+        rng = self.rng
+        run = uuid.uuid4().hex[:8]
+        users = []
+        for u in range(options['users']):
+            user = get_user_model().objects.create_user(
+                email=f'benchmark-{run}-{u}@example.com',
+            )
+            token = Token.objects.create(user=user)
+            proguides = ProGuide.objects.bulk_create(
+                [
+                    ProGuide(
+                        user=user,
+                        title=' '.join(rng.sample(WORDS, 3)),
+                        description=' '.join(rng.choices(WORDS, k=30)),
+                        time_minutes=rng.randint(5, 180),
+                        price=Decimal(rng.randint(100, 5000)) / 100,
+                        link=f'https://example.com/{u}/{i}',
+                    )
+                    for i in range(options['proguides'])
+                ],
+                batch_size=BATCH_SIZE,
+            )
+            if not all(proguide.pk for proguide in proguides):
+                proguides = list(ProGuide.objects.filter(user=user))
+
+            attrs = {}
+            for field_name, model in (('tags', Tag),
+                                      ('ingredients', Ingredient)):
+                objs = model.objects.bulk_create(
+                    [model(user=user, name=f'{field_name} {i}')
+                     for i in range(max(options['tags'] * 10, 1))]
+                )
+                if not all(obj.pk for obj in objs):
+                    objs = list(model.objects.filter(user=user))
+                attrs[field_name] = objs
+                field = ProGuide._meta.get_field(field_name)
+                through = field.remote_field.through
+                column = f'{field.m2m_reverse_field_name()}_id'
+                through.objects.bulk_create(
+                    [
+                        through(proguide_id=proguide.pk, **{column: obj.pk})
+                        for proguide in proguides
+                        for obj in rng.sample(
+                            objs, min(options['tags'], len(objs)))
+                    ],
+                    batch_size=BATCH_SIZE,
+                )
+            users.append((user, token, {
+                'proguides': [proguide.pk for proguide in proguides],
+                **attrs,
+            }))
+        return users
+
+    def _image(self):
+        """return a new 800x600 jpeg upload"""
+        if not hasattr(self, '_jpeg'):
+            image = Image.frombytes(
+                'RGB', (800, 600), self.rng.randbytes(800 * 600 * 3))
+            buffer = BytesIO()
+            image.save(buffer, format='JPEG', quality=85)
+            self._jpeg = buffer.getvalue()
+        return SimpleUploadedFile('image.jpg', self._jpeg,
+                                  content_type='image/jpeg')
+
+    def _request(self, scenario, user, data):
+        """send one request of a scenario, return the response"""
+        rng = self.rng
+        client = self.client
+        names = [obj.name for obj in rng.sample(
+            data['tags'], min(2, len(data['tags'])))]
+        if scenario == 'list':
+            return client.get(reverse('proguide:proguide-list'))
+        if scenario == 'filter':
+            return client.get(reverse('proguide:proguide-list'), {
+                'tags': ','.join(str(tag.pk) for tag in rng.sample(
+                    data['tags'], min(2, len(data['tags'])))),
+                'ingredients': str(rng.choice(data['ingredients']).pk),
+            })
+        if scenario == 'create':
+            return client.post(reverse('proguide:proguide-list'), {
+                'title': ' '.join(rng.sample(WORDS, 3)),
+                'time_minutes': rng.randint(5, 180),
+                'price': '12.50',
+                'tags': [{'name': name} for name in names],
+                'ingredients': [
+                    {'name': f'ingredient {rng.getrandbits(32):08x}'}],
+            }, format='json')
+
+        proguide_id = rng.choice(data['proguides'])
+        if scenario == 'detail':
+            return client.get(
+                reverse('proguide:proguide-detail', args=[proguide_id]))
+        if scenario == 'update':
+            return client.patch(
+                reverse('proguide:proguide-detail', args=[proguide_id]),
+                {'title': ' '.join(rng.sample(WORDS, 3)),
+                 'tags': [{'name': name} for name in names]},
+                format='json',
+            )
+        return client.post(
+            reverse('proguide:proguide-upload-image', args=[proguide_id]),
+            {'image': self._image()}, format='multipart',
+        )
+
+    def _run(self, scenario, users, options):
+        """send the requests of a scenario, return its metrics"""
+        expected = 201 if scenario == 'create' else 200
+        latencies = []
+        queries = []
+        db_times = []
+        # every user (and so its token) is seen once before measuring
+        warmup = max(options['warmup'], len(users))
+        for i in range(warmup + options['requests']):
+            user, token, data = users[i % len(users)]
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            start = time.perf_counter()
+            response = self._request(scenario, user, data)
+            elapsed = time.perf_counter() - start
+            if response.status_code != expected:
+                raise CommandError(
+                    f'{scenario}: {response.status_code} {response.content}')
+            if i >= warmup:
+                latencies.append(elapsed)
+                count, db_time = db_timing(response)
+                queries.append(count)
+                db_times.append(db_time)
+
+        if not latencies:
+            raise CommandError('--requests must be at least 1')
+        metrics = {'requests': len(latencies)}
+        for percent in PERCENTILES:
+            metrics[f'p{percent}_ms'] = round(
+                percentile(latencies, percent) * 1000, 3)
+        metrics.update({
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'max_ms': round(max(latencies) * 1000, 3),
+            'db_mean_ms': round(sum(db_times) / len(db_times) * 1000, 3),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            # one client sending the requests one after the other
+            'throughput_rps': round(len(latencies) / sum(latencies), 1),
+        })
+        return metrics
+
+    def _report(self, scenario, metrics):
+        self.stdout.write(
+            f'{scenario}: {metrics["throughput_rps"]:,.1f} req/sec, '
+            f'p50 {metrics["p50_ms"]:.1f}ms, p95 {metrics["p95_ms"]:.1f}ms, '
+            f'p99 {metrics["p99_ms"]:.1f}ms, '
+            f'{metrics["queries_mean"]:g} queries/request '
+            f'({metrics["queries_max"]} max)'
+        )
+
+    def _document(self, results, options):
+        """return the json written to --output"""
+        return {
+            'created': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+            },
+            'options': {
+                key: options[key]
+                for key in ('users', 'proguides', 'tags', 'requests',
+                            'warmup', 'seed', 'cache')
+            },
+            'scenarios': results,
+        }
@@ -0,0 +1,119 @@
+"""
+django command comparing the regular and the fast proguide list serializers.
+"""
+import json
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.models import ProGuide, Tag, Ingredient
+from proguide.serializers import (
+    BATCH_SIZE,
+    ProGuideSerializer,
+    ProGuideRowsSerializer,
+    nested_prefetches,
+)
+
+
+class Command(BaseCommand):
+    "django command to benchmark proguide list serialization"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[1000, 10000, 100000],
+            help='number of proguides to serialize, one run per value',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='runs per serializer, the best one is reported',
+        )
+        parser.add_argument(
+            '--tags', type=int, default=3,
+            help='tags and ingredients linked to every proguide',
+        )
+
+    def handle(self, *args, **options):
+        """ entrypoint for command. """
+        for count in options['rows']:
+            # sample data lives only inside this transaction
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(
+                    email=f'benchmark-{uuid.uuid4().hex}@example.com',
+                )
+                self._populate(user, count, options['tags'])
+                queryset = ProGuide.objects.filter(user=user).order_by('-id')
+                regular, regular_data = self._measure(
+                    lambda: ProGuideSerializer(
+                        queryset.prefetch_related(*nested_prefetches()),
+                        many=True,
+                    ).data,
+                    options['repeat'],
+                )
+                fast, fast_data = self._measure(
+                    lambda: ProGuideRowsSerializer(
+                        queryset.values(*ProGuideRowsSerializer.ROW_FIELDS),
+                    ).data,
+                    options['repeat'],
+                )
+                transaction.set_rollback(True)
+
+            if self._dumps(regular_data) != self._dumps(fast_data):
+                raise CommandError(f'{count} rows: outputs differ')
+            self.stdout.write(
+                f'{count} rows: '
+                f'regular {count / regular:,.0f} rows/sec, '
+                f'fast {count / fast:,.0f} rows/sec '
+                f'({regular / fast:.1f}x)'
+            )
+
+    def _populate(self, user, count, links):
+        """create proguides, each linked to `links` tags and ingredients"""
+        proguides = ProGuide.objects.bulk_create(
+            [
+                ProGuide(user=user, title=f'proguide {i}', time_minutes=i,
+                         price=Decimal(i % 1000) / 4, link=f'/proguide/{i}')
+                for i in range(count)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        if not all(proguide.pk for proguide in proguides):
+            proguides = list(ProGuide.objects.filter(user=user))
+
+        for field_name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            objs = model.objects.bulk_create(
+                [model(user=user, name=f'{field_name} {i}')
+                 for i in range(max(links * 10, 1))]
+            )
+            if not all(obj.pk for obj in objs):
+                objs = list(model.objects.filter(user=user))
+            field = ProGuide._meta.get_field(field_name)
+            through = field.remote_field.through
+            column = f'{field.m2m_reverse_field_name()}_id'
+            through.objects.bulk_create(
+                [
+                    through(proguide_id=proguide.pk,
+                            **{column: objs[(i + j) % len(objs)].pk})
+                    for i, proguide in enumerate(proguides)
+                    for j in range(links)
+                ],
+                batch_size=BATCH_SIZE,
+            )
+
+    def _measure(self, serialize, repeat):
+        """return the best time of `repeat` runs, queries included"""
+        best = None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            data = serialize()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, data
+
+    def _dumps(self, data):
+        return json.dumps(data, cls=JSONEncoder)
@@ -0,0 +1,214 @@
+"""
+django command load testing the proguide read apis while the database
+is slow: one WSGI worker (as started by uwsgi in scripts/run.sh) against
+one ASGI worker serving the async views (scripts/run_asgi.sh).
+"""
+import asyncio
+import io
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core.models import ProGuide
+
+
+class Command(BaseCommand):
+    "django command comparing a WSGI and an ASGI worker on a slow database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='requests sent per run',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='requests in flight at the same time',
+        )
+        parser.add_argument(
+            '--db-delay', type=float, default=0.05,
+            help='seconds added to every sql query (slow database)',
+        )
+        parser.add_argument(
+            '--wsgi-threads', type=int, default=1,
+            help='threads of the WSGI worker (uwsgi --threads)',
+        )
+        parser.add_argument(
+            '--host', default='localhost',
+            help='Host header sent, must be in ALLOWED_HOSTS',
+        )
+
+    def handle(self, *args, **options):
+        """ entrypoint for command. """
+        self.db_delay = options['db_delay']
+        self.lock = threading.Lock()
+        user, token, paths = self._create_data()
+        connection_created.connect(self._slow_down)
+        # like scripts/run_asgi.sh: the pool threads must not keep their
+        # connections after the run
+        max_ages = {}
+        for connection in connections.all():
+            max_ages[connection.alias] = connection.settings_dict[
+                'CONN_MAX_AGE']
+            connection.settings_dict['CONN_MAX_AGE'] = 0
+        try:
+            runs = (
+                ('wsgi', 'app.urls', self._run_wsgi),
+                ('asgi', 'app.asgi_urls', self._run_asgi),
+            )
+            for label, urlconf, run in runs:
+                self.in_flight = self.peak = 0
+                # every request has to reach the database
+                with override_settings(
+                    ROOT_URLCONF=urlconf,
+                    PROGUIDE_CACHE={**settings.PROGUIDE_CACHE, 'TIMEOUT': 0},
+                ):
+                    elapsed, statuses = asyncio.run(
+                        self._run(run, paths, token, options))
+
+                if set(statuses) != {200}:
+                    raise CommandError(f'{label}: responses {statuses}')
+                self.stdout.write(
+                    f'{label}: {options["requests"] / elapsed:,.1f} req/sec, '
+                    f'{self.peak} queries in flight at most'
+                )
+        finally:
+            for alias, max_age in max_ages.items():
+                connections[alias].settings_dict['CONN_MAX_AGE'] = max_age
+            connection_created.disconnect(self._slow_down)
+            user.delete()
+
+    def _create_data(self):
+        """create a user, its token and proguides, return request paths"""
+        user = get_user_model().objects.create_user(
+            email=f'loadtest-{uuid.uuid4().hex}@example.com',
+        )
+        token = Token.objects.create(user=user)
+        proguides = ProGuide.objects.bulk_create([
+            ProGuide(user=user, title=f'proguide {i}', time_minutes=i,
+                     price=Decimal('1.50'))
+            for i in range(20)
+        ])
+        if not all(proguide.pk for proguide in proguides):
+            proguides = list(ProGuide.objects.filter(user=user))
+        paths = [
+            f'/api/proguide/proguides/{proguide.pk}/'
+            for proguide in proguides
+        ]
+        paths += ['/api/proguide/proguides/', '/api/proguide/tags/']
+        return user, token, paths
+
+    def _slow_down(self, sender, connection, **kwargs):
+        """add the delay to every query of an opened connection"""
+        # fired again whenever the thread's connection is reopened
+        if self._slow_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self._slow_query)
+
+    def _slow_query(self, execute, sql, params, many, context):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.db_delay)
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    async def _run(self, run, paths, token, options):
+        """send the requests from concurrent clients, return the timing"""
+        remaining = iter(range(options['requests']))
+        statuses = Counter()
+        send = run(options)
+        headers = {
+            'host': options['host'],
+            'authorization': f'Token {token.key}',
+        }
+
+        async def client():
+            for i in remaining:
+                status = await send(paths[i % len(paths)], headers)
+                statuses[status] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client() for _ in range(max(options['concurrency'], 1))
+        ))
+        return time.perf_counter() - start, dict(statuses)
+
+    def _run_wsgi(self, options):
+        """return a sender using a WSGI application on a few threads"""
+        application = get_wsgi_application()
+        executor = ThreadPoolExecutor(max_workers=options['wsgi_threads'])
+
+        def request(path, headers):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': io.BytesIO(),
+                'wsgi.errors': io.StringIO(),
+                'HTTP_HOST': headers['host'],
+                'HTTP_AUTHORIZATION': headers['authorization'],
+            }
+            status = []
+            response = application(
+                environ, lambda value, headers: status.append(value))
+            b''.join(response)
+            response.close()
+            return int(status[0].split()[0])
+
+        async def send(path, headers):
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, request, path, headers)
+        return send
+
+    def _run_asgi(self, options):
+        """return a sender calling the ASGI application"""
+        application = get_asgi_application()
+
+        async def send(path, headers):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [(key.encode(), value.encode())
+                            for key, value in headers.items()],
+                'client': ('127.0.0.1', 0),
+                'server': ('localhost', 80),
+            }
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'',
+                        'more_body': False}
+
+            async def collect(message):
+                messages.append(message)
+
+            await application(scope, receive, collect)
+            return messages[0]['status']
+        return send
@@ -0,0 +1,29 @@
+"""
+django command running the proguide image processing worker.
+"""
+from django.core.management.base import BaseCommand
+
+from proguide.images import run_worker
+
+
+class Command(BaseCommand):
+    "django command to generate queued proguide image variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='process the pending jobs and exit',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='seconds to wait when the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        """ entrypoint for command. """
+        self.stdout.write('processing image jobs ....')
+        processed = run_worker(
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'{processed} jobs processed.'))
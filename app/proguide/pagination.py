@@ -0,0 +1,20 @@
+"""pagination classes for proguide apis"""
+from rest_framework.pagination import CursorPagination
+
+
+class ProGuideCursorPagination(CursorPagination):
+    """
+    keyset pagination over proguides, newest first.
+    every page is a `WHERE id < cursor ORDER BY id DESC LIMIT n` query,
+    so deep pages cost the same as the first one.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        # search results page by rank, ties (equal ranks) by id
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
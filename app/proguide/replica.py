@@ -0,0 +1,43 @@
+"""
+replica reads for the proguide apis (core.routers).
+
+safe requests read from the replica once the user is authenticated:
+authentication and permissions stay on the primary, a token just
+created may not have reached the replica yet. for the same reason a
+user's reads stay on the primary for DB_REPLICA_PIN_SECONDS after one of
+their requests wrote, so they never get (or cache) older data than what
+they just wrote.
+"""
+from django.conf import settings
+
+from rest_framework.permissions import SAFE_METHODS
+
+from core import routers
+from proguide.cache import get_cache
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+class ReplicaReadMixin:
+    """read safe requests from the replica database when configured"""
+
+    def dispatch(self, request, *args, **kwargs):
+        with routers.replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in SAFE_METHODS
+            and routers.replica_configured()
+            and not get_cache().get(_pin_key(request.user.pk))
+        ):
+            routers.use_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if routers.wrote() and request.user.is_authenticated:
+            get_cache().set(_pin_key(request.user.pk), True,
+                            settings.DB_REPLICA_PIN_SECONDS)
+        return super().finalize_response(request, response, *args, **kwargs)
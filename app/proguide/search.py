@@ -0,0 +1,47 @@
+"""
+full-text search over proguide title and description.
+
+on postgres the query is matched against the trigger maintained, GIN
+indexed `ProGuide.search_vector` and ranked with ts_rank (title matches
+weigh more than description matches). other backends (sqlite in tests)
+fall back to case-insensitive LIKE on both columns.
+every search annotates `search_rank`, the pagination orders by it.
+"""
+import operator
+from functools import reduce
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
+
+# must match the config used by the trigger in core migration 0009
+SEARCH_CONFIG = 'simple'
+
+
+def search_proguides(queryset, terms):
+    """filter proguides matching the search terms, annotate search_rank"""
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(terms, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        # ts_rank is a real: its value rounded to a python float no
+        # longer compares equal to it, and a cursor position built from it
+        # would never move past its own row
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query),
+                             FloatField()),
+        )
+
+    words = terms.split()
+    if not words:
+        return queryset.none()
+    for word in words:
+        queryset = queryset.filter(
+            Q(title__icontains=word) | Q(description__icontains=word))
+    in_title = reduce(operator.and_, (Q(title__icontains=word)
+                                      for word in words))
+    return queryset.annotate(search_rank=Case(
+        When(in_title, then=Value(1.0)),
+        default=Value(0.5),
+        output_field=FloatField(),
+    ))
@@ -1,10 +1,65 @@
 """serializers for proguide apis"""
+import operator
+from functools import reduce
+
+from django.db import connections, router, transaction
+from django.db.models import Prefetch, Q, Value, prefetch_related_objects
+from django.db.models.functions import Lower
+from django.utils import timezone
+
 from rest_framework import serializers
 
 from core.models import ProGuide, Tag, Ingredient
+from proguide.cache import invalidate_user
+from proguide.fields import HeaderValidatedImageField
+from proguide.images import variant_urls
+
+
+# rows per statement for bulk inserts/updates/deletes
+BATCH_SIZE = 500
+
+
+def name_keys(model, names):
+    """
+    map tag/ingredient names to their case-normalized key, unique per
+    user, as the database builds it with Lower('name')
+    """
+    # python and sql only lower ascii the same way
+    keys = {name: name.lower() for name in names if name.isascii()}
+    others = [name for name in dict.fromkeys(names) if name not in keys]
+    if others:
+        with connections[router.db_for_write(model)].cursor() as cursor:
+            for i in range(0, len(others), BATCH_SIZE):
+                chunk = others[i:i + BATCH_SIZE]
+                cursor.execute('SELECT ' + ', '.join(
+                    ['LOWER(CAST(%s AS TEXT))'] * len(chunk)), chunk)
+                keys.update(zip(chunk, cursor.fetchone()))
+    return keys
+
+
+def nested_prefetches():
+    """prefetch tags and ingredients ordered by id, as the fast list does"""
+    return [
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')),
+    ]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class UniqueNameMixin(serializers.Serializer):
+    """reject renaming to a name the user already has, in any case"""
+
+    def validate_name(self, value):
+        # nested in a proguide, existing names are reused instead
+        if self.instance is not None and self.Meta.model.objects.annotate(
+            name_key=Lower('name'),
+        ).filter(
+            user=self.instance.user_id, name_key=Lower(Value(value)),
+        ).exclude(pk=self.instance.pk).exists():
+            raise serializers.ValidationError('this name already exists.')
+        return value
+
+
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """serializer for tags"""
     class Meta:
         model = Tag
@@ -12,7 +67,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """serializer for ingredients"""
 
     class Meta:
@@ -21,6 +76,97 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class UsageCountMixin(serializers.Serializer):
+    """number of proguides using the item, annotated by the view"""
+    usage_count = serializers.IntegerField(read_only=True)
+
+
+class TagUsageSerializer(UsageCountMixin, TagSerializer):
+    """serializer for tags with their usage count"""
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['usage_count']
+
+
+class IngredientUsageSerializer(UsageCountMixin, IngredientSerializer):
+    """serializer for ingredients with their usage count"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ['usage_count']
+
+
+class ProGuideBulkSerializer(serializers.ListSerializer):
+    """create or update many proguides with batched queries"""
+
+    RELATIONS = (('tags', Tag), ('ingredients', Ingredient))
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """create all proguides with bulk inserts"""
+        relations = self._pop_relations(validated_data)
+        proguides = ProGuide.objects.bulk_create(
+            [ProGuide(**attrs) for attrs in validated_data],
+            batch_size=BATCH_SIZE,
+        )
+        self._save_relations(proguides, relations, created=True)
+        return proguides
+
+    @transaction.atomic
+    def update(self, instances, validated_data):
+        """update proguides (paired by position) with bulk updates"""
+        relations = self._pop_relations(validated_data)
+        fields = {'updated_at'}
+        now = timezone.now()
+        for proguide, attrs in zip(instances, validated_data):
+            for attr, value in attrs.items():
+                setattr(proguide, attr, value)
+            fields.update(attrs)
+            # bulk_update skips auto_now
+            proguide.updated_at = now
+
+        ProGuide.objects.bulk_update(
+            instances, sorted(fields), batch_size=BATCH_SIZE,
+        )
+        self._save_relations(instances, relations)
+        return instances
+
+    def _pop_relations(self, validated_data):
+        """take nested tags/ingredients out of every item"""
+        return {
+            field_name: [attrs.pop(field_name, None)
+                         for attrs in validated_data]
+            for field_name, model in self.RELATIONS
+        }
+
+    def _save_relations(self, proguides, relations, created=False):
+        """resolve names once for all items, then sync links in bulk"""
+        for field_name, model in self.RELATIONS:
+            pairs = [
+                (proguide, items)
+                for proguide, items in zip(proguides, relations[field_name])
+                if items is not None
+            ]
+            if not pairs:
+                continue
+            by_name = self.child._resolve_names(
+                model,
+                [item['name'] for _, items in pairs for item in items],
+            )
+            self.child._set_attrs(
+                field_name,
+                {proguide: [by_name[item['name']] for item in items]
+                 for proguide, items in pairs},
+                current={} if created else None,
+            )
+
+        for user_id in {proguide.user_id for proguide in proguides}:
+            invalidate_user(user_id)
+        # serialize the response from fresh relations in two queries
+        for proguide in proguides:
+            proguide._prefetched_objects_cache = {}
+        prefetch_related_objects(proguides, *nested_prefetches())
+
+
 class ProGuideSerializer(serializers.ModelSerializer):
     """serializer for proguide"""
     tags = TagSerializer(many=True, required=False)
@@ -31,50 +177,148 @@ class ProGuideSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'time_minutes',
                   'price', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
+        list_serializer_class = ProGuideBulkSerializer
 
     # در ابتدای نام تابع اندرسکور ب معنای تاکید هستش
-    def _get_or_create_tags(self, tags, proguide):
-        """handle getting or creating tags as needed"""
+    def _get_or_create_attrs(self, model, items):
+        """return tag/ingredient objects by name, creating missing ones"""
+        objs = self._resolve_names(model, [item['name'] for item in items])
+        # one object per name key, keeping the order of the payload
+        return list(dict.fromkeys(objs[item['name']] for item in items))
+
+    def _resolve_names(self, model, names):
+        """map names to the user's tag/ingredient objects, creating them"""
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                # getting all value asign to tags
-                **tag,
+        keys = name_keys(model, names)
+        # the first name given for a key is the one created
+        first_names = {}
+        for name in names:
+            first_names.setdefault(keys[name], name)
+        if not first_names:
+            return {}
+
+        objs = self._attrs_by_name(model, auth_user, first_names)
+        missing = [key for key in first_names if key not in objs]
+        if missing:
+            # ON CONFLICT DO NOTHING: a concurrent request creating the
+            # same name can't fail this one or make a duplicate, the rows
+            # are read back whoever inserted them
+            model.objects.bulk_create(
+                [model(user=auth_user, name=first_names[key])
+                 for key in missing],
+                ignore_conflicts=True,
             )
-            proguide.tags.add(tag_obj)
+            objs.update(self._attrs_by_name(model, auth_user, missing))
 
-    def _get_or_create_ingredients(self, ingredients, proguide):
-        """handle getting or creating ingredients as needed"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, create = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
+        return {name: objs[keys[name]] for name in names}
+
+    def _attrs_by_name(self, model, user, keys):
+        """map name key to object for the user's tags/ingredients"""
+        # served by the unique (lower(name), user) index
+        return {
+            obj.name_key: obj
+            for obj in model.objects.annotate(
+                name_key=Lower('name'),
+            ).filter(user=user, name_key__in=keys)
+        }
+
+    def _set_attrs(self, field_name, wanted, current=None):
+        """
+        sync a relation of one or many proguides, writing only the rows
+        that change: one bulk delete and one bulk insert per batch.
+        `wanted` maps proguide -> objects it should be linked to.
+        `current` maps proguide id -> linked ids when the caller already
+        knows them (empty for new proguides), otherwise they come from
+        prefetched relations or from a single through-table query.
+        """
+        field = ProGuide._meta.get_field(field_name)
+        through = field.remote_field.through
+        column = f'{field.m2m_reverse_field_name()}_id'
+        if current is None:
+            current = self._linked_ids(field_name, through, column, wanted)
+
+        removed = []
+        added = []
+        for proguide, objs in wanted.items():
+            linked = current.get(proguide.pk, set())
+            target_ids = list(dict.fromkeys(obj.pk for obj in objs))
+            gone = linked.difference(target_ids)
+            if gone:
+                removed.append(Q(proguide_id=proguide.pk,
+                                 **{f'{column}__in': gone}))
+            added.extend(
+                through(proguide_id=proguide.pk, **{column: pk})
+                for pk in target_ids if pk not in linked
             )
-            proguide.ingredients.add(ingredient_obj)
 
+        for i in range(0, len(removed), BATCH_SIZE):
+            through.objects.filter(
+                reduce(operator.or_, removed[i:i + BATCH_SIZE])
+            ).delete()
+        if added:
+            through.objects.bulk_create(
+                added, batch_size=BATCH_SIZE, ignore_conflicts=True,
+            )
+        if removed or added:
+            # bulk writes on the through table send no m2m_changed
+            for user_id in {proguide.user_id for proguide in wanted}:
+                invalidate_user(user_id)
+
+    def _linked_ids(self, field_name, through, column, proguides):
+        """map proguide id -> currently linked ids"""
+        current = {}
+        unknown = []
+        for proguide in proguides:
+            prefetched = getattr(proguide, '_prefetched_objects_cache', {})
+            if field_name in prefetched:
+                current[proguide.pk] = {
+                    obj.pk for obj in prefetched[field_name]
+                }
+            else:
+                unknown.append(proguide.pk)
+
+        if unknown:
+            rows = through.objects.filter(
+                proguide_id__in=unknown,
+            ).values_list('proguide_id', column)
+            for proguide_id, target_id in rows:
+                current.setdefault(proguide_id, set()).add(target_id)
+        return current
+
+    @transaction.atomic
     def create(self, validated_date):
         """create a proguide """
         # using pop for ensore remove tags befor create (getting empty list)
         tags = validated_date.pop('tags', [])
         ingredients = validated_date.pop('ingredients', [])
         proguide = ProGuide.objects.create(**validated_date)
-        self._get_or_create_tags(tags, proguide)
-        self._get_or_create_ingredients(ingredients, proguide)
+        self._set_attrs(
+            'tags',
+            {proguide: self._get_or_create_attrs(Tag, tags)},
+            current={},
+        )
+        self._set_attrs(
+            'ingredients',
+            {proguide: self._get_or_create_attrs(Ingredient, ingredients)},
+            current={},
+        )
 
         return proguide
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """updating proguide"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_attrs(
+                'tags', {instance: self._get_or_create_attrs(Tag, tags)},
+            )
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._set_attrs(
+                'ingredients',
+                {instance: self._get_or_create_attrs(Ingredient, ingredients)},
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -83,17 +327,111 @@ class ProGuideSerializer(serializers.ModelSerializer):
         return instance
 
 
-class ProGuideDetailSerializer(ProGuideSerializer):
+class ProGuideRowsSerializer(serializers.BaseSerializer):
+    """
+    read only fast path producing the same output as ProGuideSerializer
+    for a page of `values()` rows: plain dicts instead of per-field
+    serializers, nested tags and ingredients grouped from one through
+    table query per relation (ordered by id, like the list prefetch).
+    """
+    ROW_FIELDS = ['id', 'title', 'time_minutes', 'price', 'link']
+    RELATIONS = ('tags', 'ingredients')
+    price_field = serializers.DecimalField(
+        max_digits=ProGuide._meta.get_field('price').max_digits,
+        decimal_places=ProGuide._meta.get_field('price').decimal_places,
+    )
+
+    def _grouped(self, field_name, ids):
+        """map proguide id -> [{'id', 'name'}] for a relation"""
+        field = ProGuide._meta.get_field(field_name)
+        target = field.m2m_reverse_field_name()
+        rows = field.remote_field.through.objects.filter(
+            proguide_id__in=ids,
+        ).order_by(f'{target}_id').values_list(
+            'proguide_id', f'{target}_id', f'{target}__name',
+        )
+        grouped = {}
+        for proguide_id, pk, name in rows:
+            grouped.setdefault(proguide_id, []).append(
+                {'id': pk, 'name': name})
+        return grouped
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        ids = [row['id'] for row in rows]
+        if not ids:
+            return []
+        tags, ingredients = (
+            self._grouped(field_name, ids) for field_name in self.RELATIONS
+        )
+        price = self.price_field.to_representation
+        return [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'time_minutes': row['time_minutes'],
+                'price': price(row['price']),
+                'link': row['link'],
+                'tags': tags.get(row['id'], []),
+                'ingredients': ingredients.get(row['id'], []),
+            }
+            for row in rows
+        ]
+
+
+class ImageVariantsMixin(serializers.Serializer):
+    """expose the generated image variant urls once they are ready"""
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj) -> dict:
+        return variant_urls(obj, self.context.get('request'))
+
+
+class ProGuideDetailSerializer(ImageVariantsMixin, ProGuideSerializer):
     """serializer for ProGuide detail view"""
 
     class Meta(ProGuideSerializer.Meta):
-        fields = ProGuideSerializer.Meta.fields + ['description', 'image']
+        fields = ProGuideSerializer.Meta.fields + [
+            'description', 'image', 'image_variants']
+        # written through upload-image only: validated from the header
+        # and its variants queued
+        read_only_fields = ProGuideSerializer.Meta.read_only_fields + [
+            'image']
+
+
+class ProGuideBulkDeleteSerializer(serializers.Serializer):
+    """serializer for deleting many proguides by id"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+    )
 
 
-class ProGuideImageSerializer(serializers.ModelSerializer):
+class ProGuideBulkDeleteResultSerializer(serializers.Serializer):
+    """per item result of a bulk delete"""
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=['deleted', 'not_found'])
+
+
+class ProGuideFacetSerializer(serializers.Serializer):
+    """number of proguides using a tag or an ingredient"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class ProGuideFacetsSerializer(serializers.Serializer):
+    """tag and ingredient facets of a filtered proguide list"""
+    tags = ProGuideFacetSerializer(many=True)
+    ingredients = ProGuideFacetSerializer(many=True)
+
+
+class ProGuideImageSerializer(ImageVariantsMixin,
+                              serializers.ModelSerializer):
     """serializer for uploading images to proguide"""
+    image = HeaderValidatedImageField()
+
     class Meta:
         model = ProGuide
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         read_only_fields = ['id']
-        extra_kwargs = {'image': {'required': 'True'}}
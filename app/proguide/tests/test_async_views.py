@@ -0,0 +1,96 @@
+"""tests for the ASGI (async) proguide views"""
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from core.models import ProGuide, Tag
+from proguide import async_views
+
+
+@override_settings(ROOT_URLCONF='app.asgi_urls')
+class AsyncViewsTests(TransactionTestCase):
+    """test the async urlconf serves the same apis"""
+
+    def setUp(self):
+        # as in scripts/run_asgi.sh, read threads don't keep connections
+        for connection in connections.all():
+            patcher = patch.dict(connection.settings_dict, CONN_MAX_AGE=0)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com',
+            '12345678',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.proguide = ProGuide.objects.create(
+            user=self.user,
+            title='object num1',
+            time_minutes=22,
+            price=Decimal('1.11'),
+        )
+        self.proguide.tags.add(Tag.objects.create(user=self.user, name='pen'))
+
+    def test_reads_run_in_read_pool(self):
+        """test list, detail and tags are served from the read pool"""
+        urls = [
+            reverse('proguide:proguide-list'),
+            reverse('proguide:proguide-detail', args=[self.proguide.id]),
+            reverse('proguide:tag-list'),
+        ]
+        with patch('proguide.async_views._run_read',
+                   wraps=async_views._run_read) as run_read:
+            results = [self.client.get(url) for url in urls]
+
+        self.assertEqual(run_read.call_count, len(urls))
+        for result in results:
+            self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            results[0].data['results'][0]['tags'][0]['name'], 'pen')
+        self.assertEqual(results[1].data['title'], 'object num1')
+
+    def test_server_timing_of_pool_reads(self):
+        """test the queries and rendering of the read pool are timed"""
+        res = self.client.get(reverse('proguide:tag-list'))
+
+        timing = res['Server-Timing']
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('render;dur=', timing)
+
+    def test_writes_keep_default_thread(self):
+        """test a create through the async urlconf is not pooled"""
+        payload = {
+            'title': 'object num2',
+            'time_minutes': 30,
+            'price': '3.41',
+            'tags': [{'name': 'pen'}],
+        }
+        with patch('proguide.async_views._run_read',
+                   wraps=async_views._run_read) as run_read:
+            result = self.client.post(
+                reverse('proguide:proguide-list'), payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        run_read.assert_not_called()
+        self.assertEqual(ProGuide.objects.filter(user=self.user).count(), 2)
+
+    def test_loadtest_command(self):
+        """test the load test runs both modes and removes its data"""
+        out = StringIO()
+
+        call_command('loadtest_asgi', '--requests', '10',
+                     '--concurrency', '5', '--db-delay', '0',
+                     '--host', 'testserver', stdout=out)
+
+        self.assertIn('wsgi:', out.getvalue())
+        self.assertIn('asgi:', out.getvalue())
+        self.assertEqual(get_user_model().objects.count(), 1)
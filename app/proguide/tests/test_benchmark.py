@@ -0,0 +1,134 @@
+"""
+tests for the proguide api benchmark.
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core.models import ProGuide
+from proguide.management.commands.benchmark_api import (
+    SCENARIOS,
+    check,
+    percentile,
+)
+
+
+class BenchmarkCommandTests(TestCase):
+    """test the benchmark_api command."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _call(self, *args):
+        out = StringIO()
+        # requests run inside the test transaction (savepoints) here, the
+        # default thresholds are for a real database
+        call_command('benchmark_api', '--users', '2', '--proguides', '5',
+                     '--requests', '3', '--warmup', '1', '--thresholds', '',
+                     '--host', 'testserver', *args, stdout=out)
+        return out.getvalue()
+
+    def _write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as data_file:
+            json.dump(data, data_file)
+        return path
+
+    def test_results(self):
+        """test every scenario is measured and the data is removed."""
+        output = os.path.join(self.directory, 'results.json')
+
+        out = self._call('--output', output)
+
+        with open(output) as results_file:
+            results = json.load(results_file)
+        self.assertEqual(list(results['scenarios']), SCENARIOS)
+        for scenario in SCENARIOS:
+            self.assertIn(f'{scenario}:', out)
+            metrics = results['scenarios'][scenario]
+            self.assertEqual(metrics['requests'], 3)
+            self.assertGreater(metrics['queries_max'], 0)
+            self.assertLessEqual(metrics['p50_ms'], metrics['p99_ms'])
+            self.assertGreater(metrics['throughput_rps'], 0)
+        self.assertEqual(results['options']['seed'], 0)
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(ProGuide.objects.exists())
+
+    def test_thresholds(self):
+        """test a metric above its threshold fails the run."""
+        path = self._write('thresholds.json',
+                           {'list': {'queries_max': 1}})
+
+        with self.assertRaisesRegex(CommandError,
+                                    r'list queries_max: \d+ \(threshold 1\)'):
+            self._call('--scenarios', 'list', '--thresholds', path)
+
+    def test_baseline(self):
+        """test more queries than the baseline fails the run."""
+        output = os.path.join(self.directory, 'results.json')
+        self._call('--scenarios', 'detail', '--output', output)
+        with open(output) as results_file:
+            baseline = json.load(results_file)
+        baseline['scenarios']['detail']['queries_max'] -= 1
+        path = self._write('baseline.json', baseline)
+
+        with self.assertRaisesMessage(CommandError, 'detail queries_max'):
+            self._call('--scenarios', 'detail', '--baseline', path,
+                       '--tolerance', '100')
+
+
+class DefaultThresholdsTests(TransactionTestCase):
+    """test the shipped thresholds hold for the default options."""
+
+    def test_default_options(self):
+        """test a run with the defaults passes the default thresholds."""
+        out = StringIO()
+
+        # outside a test transaction, only the host differs (DEBUG off)
+        call_command('benchmark_api', '--host', 'testserver', stdout=out)
+
+        for scenario in SCENARIOS:
+            self.assertIn(f'{scenario}:', out.getvalue())
+        self.assertFalse(ProGuide.objects.exists())
+
+
+class CheckTests(SimpleTestCase):
+    """test the regression checks."""
+
+    def test_percentile(self):
+        """test nearest-rank percentiles."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_baseline_tolerance(self):
+        """test latencies and throughput may vary within the tolerance."""
+        baseline = {'list': {'p95_ms': 10.0, 'throughput_rps': 100.0}}
+
+        self.assertEqual(check(
+            {'list': {'p95_ms': 11.0, 'throughput_rps': 90.0}},
+            baseline=baseline, tolerance=0.2), [])
+        self.assertEqual(check(
+            {'list': {'p95_ms': 13.0, 'throughput_rps': 80.0}},
+            baseline=baseline, tolerance=0.2), [
+                'list p95_ms: 13 (baseline 10)',
+                'list throughput_rps: 80 (baseline 100)',
+        ])
+
+    def test_throughput_threshold(self):
+        """test throughput thresholds are lower bounds."""
+        thresholds = {'list': {'throughput_rps': 50}}
+
+        self.assertEqual(check({'list': {'throughput_rps': 60}},
+                               thresholds), [])
+        self.assertEqual(len(check({'list': {'throughput_rps': 40}},
+                                   thresholds)), 1)
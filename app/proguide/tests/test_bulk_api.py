@@ -0,0 +1,182 @@
+"""tests for the proguide bulk api"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ProGuide, Tag, Ingredient
+from core.tests.query_budget import QueryBudgetMixin
+
+from decimal import Decimal
+
+
+BULK_URL = reverse('proguide:proguide-bulk')
+
+
+def create_user(email='hameddjf33@gmail.com', password='12345678'):
+    """create and return a user"""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_proguide(user, **params):
+    """create and return a sample proguide"""
+    defaults = {
+        'title': 'object num1',
+        'time_minutes': 22,
+        'price': Decimal('1.11'),
+    }
+    defaults.update(params)
+    return ProGuide.objects.create(user=user, **defaults)
+
+
+def proguide_payload(i, **params):
+    """return a sample proguide payload"""
+    payload = {
+        'title': f'object {i}',
+        'time_minutes': 10 + i,
+        'price': '2.50',
+        'tags': [{'name': 'shared'}, {'name': f'tag {i}'}],
+        'ingredients': [{'name': f'ing {i}'}],
+    }
+    payload.update(params)
+    return payload
+
+
+class BulkProGuideApiTests(QueryBudgetMixin, TestCase):
+    """test bulk create, update and delete of proguides"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """test creating many proguides with nested tags in one call"""
+        payload = [proguide_payload(i) for i in range(3)]
+
+        result = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(result.data), 3)
+        self.assertEqual(ProGuide.objects.filter(user=self.user).count(), 3)
+        # the shared tag is created once and linked to every proguide
+        shared = Tag.objects.get(user=self.user, name='shared')
+        self.assertEqual(shared.proguide_set.count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 4)
+        for item, data in zip(payload, result.data):
+            self.assertEqual(data['title'], item['title'])
+            self.assertEqual(
+                {tag['name'] for tag in data['tags']},
+                {tag['name'] for tag in item['tags']},
+            )
+
+    def test_bulk_create_invalid_item_creates_nothing(self):
+        """test one invalid item rejects the whole batch with item errors"""
+        payload = [proguide_payload(0), proguide_payload(1, title='')]
+
+        result = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(result.data[0], {})
+        self.assertIn('title', result.data[1])
+        self.assertFalse(ProGuide.objects.exists())
+
+    def test_bulk_create_requires_list(self):
+        """test a non-list body is rejected"""
+        result = self.client.post(
+            BULK_URL, proguide_payload(0), format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_query_budget(self):
+        """test bulk create runs a fixed number of queries"""
+        payload = [proguide_payload(i) for i in range(50)]
+
+        with self.assertQueryBudget('proguide:proguide-bulk', 'POST'):
+            result = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ProGuide.objects.count(), 50)
+
+    def test_bulk_update(self):
+        """test updating many proguides in one call"""
+        p1 = create_proguide(user=self.user)
+        p2 = create_proguide(user=self.user)
+        old_tag = Tag.objects.create(user=self.user, name='old')
+        p1.tags.add(old_tag)
+        payload = [
+            {'id': p1.id, 'title': 'new title', 'tags': [{'name': 'new'}]},
+            {'id': p2.id, 'price': '9.99'},
+        ]
+
+        result = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        p1.refresh_from_db()
+        p2.refresh_from_db()
+        self.assertEqual(p1.title, 'new title')
+        self.assertEqual(
+            list(p1.tags.values_list('name', flat=True)), ['new'])
+        self.assertEqual(p2.price, Decimal('9.99'))
+        self.assertEqual(result.data[0]['tags'][0]['name'], 'new')
+
+    def test_bulk_update_unknown_id(self):
+        """test updating another user's proguide gives an item error"""
+        other = create_proguide(user=create_user(email='hameddjf01@gmail.com'))
+        mine = create_proguide(user=self.user)
+        payload = [
+            {'id': mine.id, 'title': 'new title'},
+            {'id': other.id, 'title': 'new title'},
+            {'title': 'no id'},
+        ]
+
+        result = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(result.data[0], {})
+        self.assertIn('id', result.data[1])
+        self.assertIn('id', result.data[2])
+        mine.refresh_from_db()
+        self.assertEqual(mine.title, 'object num1')
+
+    def test_bulk_delete(self):
+        """test deleting many proguides returns per item results"""
+        p1 = create_proguide(user=self.user)
+        p1.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='book'))
+        other = create_proguide(user=create_user(email='hameddjf01@gmail.com'))
+
+        result = self.client.delete(
+            BULK_URL, {'ids': [p1.id, other.id]}, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data, [
+            {'id': p1.id, 'status': 'deleted'},
+            {'id': other.id, 'status': 'not_found'},
+        ])
+        self.assertFalse(ProGuide.objects.filter(id=p1.id).exists())
+        self.assertTrue(ProGuide.objects.filter(id=other.id).exists())
+
+    def test_bulk_delete_query_budget(self):
+        """test deleting proguides runs one query per table, not per row"""
+        tag = Tag.objects.create(user=self.user, name='shared')
+        ingredient = Ingredient.objects.create(user=self.user, name='book')
+        ids = []
+        for i in range(20):
+            proguide = create_proguide(user=self.user, title=f'object {i}')
+            proguide.tags.add(tag)
+            proguide.ingredients.add(ingredient)
+            proguide.image_jobs.create(image=f'uploads/{i}.jpg')
+            ids.append(proguide.id)
+
+        with self.assertQueryBudget('proguide:proguide-bulk', 'DELETE'):
+            result = self.client.delete(
+                BULK_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertFalse(ProGuide.objects.filter(id__in=ids).exists())
+        self.assertFalse(ProGuide.tags.through.objects.exists())
+        self.assertFalse(ProGuide.ingredients.through.objects.exists())
+        self.assertTrue(Tag.objects.filter(id=tag.id).exists())
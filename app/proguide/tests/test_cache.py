@@ -0,0 +1,201 @@
+"""tests for the proguide response cache"""
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ProGuide, Tag, Ingredient
+from proguide.cache import caching_enabled
+
+from decimal import Decimal
+
+
+PROGUIDES_URL = reverse('proguide:proguide-list')
+TAGS_URL = reverse('proguide:tag-list')
+INGREDIENTS_URL = reverse('proguide:ingredient-list')
+BULK_URL = reverse('proguide:proguide-bulk')
+
+
+def create_user(email='hameddjf33@gmail.com', password='12345678'):
+    """create and return a user"""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_proguide(user, **params):
+    """create and return a sample proguide"""
+    defaults = {
+        'title': 'object num1',
+        'time_minutes': 22,
+        'price': Decimal('1.11'),
+    }
+    defaults.update(params)
+    return ProGuide.objects.create(user=user, **defaults)
+
+
+def local_cache():
+    """allow the per-process test cache (one process)"""
+    return override_settings(
+        PROGUIDE_CACHE={**settings.PROGUIDE_CACHE, 'LOCAL': True})
+
+
+@local_cache()
+class ResponseCacheTests(TestCase):
+    """test list responses are cached and invalidated on writes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _assert_cached(self, url, params=None):
+        """request url twice and check the second call runs no queries"""
+        first = self.client.get(url, params)
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(url, params)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(context.captured_queries), 0)
+        return second
+
+    def test_list_endpoints_cached(self):
+        """test repeated list calls are served from the cache"""
+        proguide = create_proguide(user=self.user)
+        proguide.tags.add(Tag.objects.create(user=self.user, name='pen'))
+        proguide.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='book'))
+
+        for url in [PROGUIDES_URL, TAGS_URL, INGREDIENTS_URL]:
+            self._assert_cached(url)
+
+    def test_query_params_normalized(self):
+        """test params in a different order share one cache entry"""
+        self.client.get(TAGS_URL, {'assigned_only': 0, 'page_size': 1})
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(f'{TAGS_URL}?page_size=1&assigned_only=0')
+
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_create_through_api_invalidates(self):
+        """test creating a proguide shows up in the next list call"""
+        self.client.get(PROGUIDES_URL)
+        payload = {
+            'title': 'object num1',
+            'time_minutes': 30,
+            'price': Decimal('3.41'),
+            'tags': [{'name': 'pen'}],
+        }
+        self.client.post(PROGUIDES_URL, payload, format='json')
+
+        result = self.client.get(PROGUIDES_URL)
+        tags = self.client.get(TAGS_URL)
+
+        self.assertEqual(len(result.data['results']), 1)
+        self.assertEqual(result.data['results'][0]['tags'][0]['name'], 'pen')
+        self.assertEqual(len(tags.data), 1)
+
+    def test_tag_rename_invalidates_proguide_list(self):
+        """test renaming a tag refreshes the nested proguide data"""
+        proguide = create_proguide(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='pen')
+        proguide.tags.add(tag)
+        self.client.get(PROGUIDES_URL)
+
+        tag.name = 'pencil'
+        tag.save()
+        result = self.client.get(PROGUIDES_URL)
+
+        self.assertEqual(result.data['results'][0]['tags'][0]['name'],
+                         'pencil')
+
+    def test_m2m_change_invalidates(self):
+        """test linking an ingredient refreshes assigned_only lists"""
+        proguide = create_proguide(user=self.user)
+        ingredient = Ingredient.objects.create(user=self.user, name='book')
+        result = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        self.assertEqual(len(result.data), 0)
+
+        proguide.ingredients.add(ingredient)
+        result = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(result.data), 1)
+
+    def test_bulk_delete_invalidates(self):
+        """test a bulk delete refreshes the list and assigned_only lists"""
+        proguide = create_proguide(user=self.user)
+        proguide.tags.add(Tag.objects.create(user=self.user, name='pen'))
+        self.client.get(PROGUIDES_URL)
+        self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.client.delete(BULK_URL, {'ids': [proguide.id]}, format='json')
+
+        result = self.client.get(PROGUIDES_URL)
+        self.assertEqual(result.data['results'], [])
+        result = self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual(len(result.data), 0)
+
+    def test_bulk_delete_bumps_version_once(self):
+        """test deleting many proguides bumps the version once"""
+        ids = [create_proguide(user=self.user).id for _ in range(5)]
+
+        with patch('proguide.cache.bump_version') as bump_version, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(BULK_URL, {'ids': ids}, format='json')
+
+        # now and once the transaction commits
+        self.assertEqual(bump_version.call_count, 2)
+
+    def test_cache_is_per_user(self):
+        """test a user never gets another user's cached list"""
+        create_proguide(user=self.user)
+        self.client.get(PROGUIDES_URL)
+
+        other_client = APIClient()
+        other_client.force_authenticate(
+            create_user(email='hameddjf01@gmail.com'))
+        result = other_client.get(PROGUIDES_URL)
+
+        self.assertEqual(result.data['results'], [])
+
+
+class PerProcessCacheTests(TestCase):
+    """test responses are not cached in a per-process cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_locmem_not_used(self):
+        """test a locmem cache would go stale in the other workers"""
+        self.client.get(TAGS_URL)
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(TAGS_URL)
+
+        self.assertGreater(len(context.captured_queries), 0)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_table',
+    }})
+    def test_shared_backend_used(self):
+        """test a backend shared by the workers is used"""
+        self.assertTrue(caching_enabled())
@@ -0,0 +1,138 @@
+"""tests for conditional GET on proguide apis"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ProGuide, Tag
+
+from decimal import Decimal
+
+
+PROGUIDES_URL = reverse('proguide:proguide-list')
+
+
+def detail_url(proguide_id):
+    """create and return a proguide detail url"""
+    return reverse('proguide:proguide-detail', args=[proguide_id])
+
+
+def create_proguide(user, **params):
+    """create and return a sample proguide"""
+    defaults = {
+        'title': 'object num1',
+        'time_minutes': 22,
+        'price': Decimal('1.11'),
+    }
+    defaults.update(params)
+    return ProGuide.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    """test ETag and Last-Modified handling"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com',
+            '12345678',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.proguide = create_proguide(user=self.user)
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_detail_not_modified(self):
+        """test a matching If-None-Match skips serialization"""
+        url = detail_url(self.proguide.id)
+        result = self.client.get(url)
+        etag = result['ETag']
+        self.assertIn('Last-Modified', result)
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(result.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(result['ETag'], etag)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_detail_if_modified_since(self):
+        """test a current If-Modified-Since gives 304"""
+        url = detail_url(self.proguide.id)
+        result = self.client.get(url)
+
+        result = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=result['Last-Modified'])
+
+        self.assertEqual(result.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_on_update(self):
+        """test updating a proguide gives a new ETag"""
+        url = detail_url(self.proguide.id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch(url, {'title': 'new title'})
+        result = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(result['ETag'], etag)
+        self.assertEqual(result.data['title'], 'new title')
+
+    def test_detail_etag_changes_on_tag_rename(self):
+        """test renaming a linked tag gives the proguide a new ETag"""
+        tag = Tag.objects.create(user=self.user, name='pen')
+        self.proguide.tags.add(tag)
+        url = detail_url(self.proguide.id)
+        etag = self.client.get(url)['ETag']
+
+        tag.name = 'pencil'
+        tag.save()
+        result = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['tags'][0]['name'], 'pencil')
+
+    @override_settings(
+        PROGUIDE_CACHE={**settings.PROGUIDE_CACHE, 'LOCAL': True})
+    def test_list_not_modified(self):
+        """test a matching list ETag is answered without queries"""
+        etag = self.client.get(PROGUIDES_URL)['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.get(PROGUIDES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(result.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    @override_settings(
+        PROGUIDE_CACHE={**settings.PROGUIDE_CACHE, 'LOCAL': True})
+    def test_list_etag_changes_on_write(self):
+        """test creating a proguide invalidates the list ETag"""
+        etag = self.client.get(PROGUIDES_URL)['ETag']
+
+        create_proguide(user=self.user, title='object num2')
+        result = self.client.get(PROGUIDES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(result.data['results']), 2)
+
+    def test_list_no_etag_per_process_versions(self):
+        """test lists get no ETag while other workers miss the versions"""
+        result = self.client.get(PROGUIDES_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', result)
+
+    def test_detail_invalid_id(self):
+        """test an id that is not a number is not found"""
+        result = self.client.get('/api/proguide/proguides/abc/')
+
+        self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
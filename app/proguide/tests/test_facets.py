@@ -0,0 +1,109 @@
+"""tests for the proguide facets api"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from decimal import Decimal
+
+from core.models import ProGuide, Tag, Ingredient
+
+
+FACETS_URL = reverse('proguide:proguide-facets')
+
+
+def create_proguide(user, **params):
+    """create and return a sample proguide"""
+    defaults = {
+        'title': 'object num1',
+        'time_minutes': 22,
+        'price': Decimal('1.11'),
+    }
+    defaults.update(params)
+    return ProGuide.objects.create(user=user, **defaults)
+
+
+@override_settings(
+    PROGUIDE_CACHE={**settings.PROGUIDE_CACHE, 'LOCAL': True})
+class ProGuideFacetsTests(TestCase):
+    """test tag and ingredient counts of the filtered proguide list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com',
+            '12345678',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='vegan')
+        self.quick = Tag.objects.create(user=self.user, name='quick')
+        self.salt = Ingredient.objects.create(user=self.user, name='salt')
+        p1 = create_proguide(self.user, title='soup')
+        p1.tags.add(self.vegan, self.quick)
+        p1.ingredients.add(self.salt)
+        p2 = create_proguide(self.user, title='salad')
+        p2.tags.add(self.vegan)
+        # unused items are not listed
+        Tag.objects.create(user=self.user, name='unused')
+
+    def test_facet_counts(self):
+        """test every tag and ingredient is counted over all proguides"""
+        result = self.client.get(FACETS_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data, {
+            'tags': [
+                {'id': self.vegan.id, 'name': 'vegan', 'count': 2},
+                {'id': self.quick.id, 'name': 'quick', 'count': 1},
+            ],
+            'ingredients': [
+                {'id': self.salt.id, 'name': 'salt', 'count': 1},
+            ],
+        })
+
+    def test_facet_counts_follow_filters(self):
+        """test counts only cover proguides matching the list filters"""
+        result = self.client.get(
+            FACETS_URL, {'tags': str(self.quick.id), 'search': 'soup'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(tag['name'], tag['count']) for tag in result.data['tags']],
+            [('quick', 1), ('vegan', 1)],
+        )
+
+    def test_facet_counts_limited_to_user(self):
+        """test other users' proguides are not counted"""
+        other = get_user_model().objects.create_user(
+            'hameddjf01@gmail.com', '12345678')
+        create_proguide(other).tags.add(
+            Tag.objects.create(user=other, name='vegan'))
+
+        result = self.client.get(FACETS_URL)
+
+        self.assertEqual(
+            [tag['name'] for tag in result.data['tags']], ['vegan', 'quick'])
+
+    def test_facet_counts_single_query_and_cached(self):
+        """test counts take one query and are cached until a write"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(FACETS_URL)
+        counted = [q for q in queries.captured_queries
+                   if 'COUNT' in q['sql'].upper()]
+        self.assertEqual(len(counted), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(FACETS_URL)
+        self.assertEqual(len(queries), 0)
+
+        create_proguide(self.user, title='stew').tags.add(self.quick)
+        result = self.client.get(FACETS_URL)
+        self.assertEqual(
+            {tag['name']: tag['count'] for tag in result.data['tags']},
+            {'vegan': 2, 'quick': 2},
+        )
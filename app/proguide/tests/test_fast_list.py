@@ -0,0 +1,81 @@
+"""tests for the fast proguide list path"""
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from core.models import ProGuide, Tag, Ingredient
+from proguide.views import ProGuideViewSet
+
+
+PROGUIDES_URL = reverse('proguide:proguide-list')
+
+
+class FastListTests(TestCase):
+    """test the fast list renders exactly what the serializer renders"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com',
+            '12345678',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tags = [Tag.objects.create(user=self.user, name=f'tag {i}')
+                for i in range(3)]
+        ingredient = Ingredient.objects.create(user=self.user, name='book')
+        prices = [Decimal('1.5'), Decimal('20'), Decimal('0.05')]
+        for i, price in enumerate(prices):
+            proguide = ProGuide.objects.create(
+                user=self.user,
+                title=f'object {i}',
+                time_minutes=i,
+                price=price,
+                link='' if i else 'http://example.com/proguide.pdf',
+            )
+            # linked in reverse id order
+            proguide.tags.add(*reversed(tags[i:]))
+            if i:
+                proguide.ingredients.add(ingredient)
+
+    def _get_content(self, fast, params=None):
+        with patch.object(ProGuideViewSet, 'fast_list', fast):
+            result = self.client.get(PROGUIDES_URL, params or {})
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        return result.content
+
+    def test_fast_list_matches_serializer(self):
+        """test the fast list output is byte identical"""
+        fast = self._get_content(True)
+        # a write drops the cached response of the first request
+        Tag.objects.create(user=self.user, name='unrelated')
+
+        self.assertEqual(fast, self._get_content(False))
+
+    def test_fast_list_matches_serializer_filtered_page(self):
+        """test filters and page size give the same output on both paths"""
+        tag = Tag.objects.get(name='tag 2')
+        params = {'tags': str(tag.id), 'page_size': 2}
+        fast = self._get_content(True, params)
+        Tag.objects.create(user=self.user, name='unrelated')
+
+        self.assertEqual(fast, self._get_content(False, params))
+
+    def test_benchmark_command(self):
+        """test the benchmark compares both paths and keeps no data"""
+        out = StringIO()
+
+        call_command('benchmark_list_serializer', '--rows', '20',
+                     '--repeat', '1', stdout=out)
+
+        self.assertIn('20 rows:', out.getvalue())
+        self.assertIn('rows/sec', out.getvalue())
+        self.assertEqual(ProGuide.objects.count(), 3)
+        self.assertEqual(get_user_model().objects.count(), 1)
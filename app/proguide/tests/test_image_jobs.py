@@ -0,0 +1,126 @@
+"""tests for background proguide image processing"""
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from PIL import Image
+from decimal import Decimal
+from io import StringIO
+import tempfile
+
+from core.models import ProGuide, ProGuideImageJob
+from proguide import images
+
+
+def detail_url(proguide_id):
+    """create and return a proguide detail url"""
+    return reverse('proguide:proguide-detail', args=[proguide_id])
+
+
+def image_upload_url(proguide_id):
+    """create and return an image upload url"""
+    return reverse('proguide:proguide-upload-image', args=[proguide_id])
+
+
+class ImageJobTests(TestCase):
+    """test uploads queue jobs and the worker creates variants"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com',
+            '12345678',
+        )
+        self.client.force_authenticate(self.user)
+        self.proguide = ProGuide.objects.create(
+            user=self.user,
+            title='object num1',
+            time_minutes=22,
+            price=Decimal('1.11'),
+        )
+
+    def tearDown(self):
+        self.proguide.refresh_from_db()
+        for path in self.proguide.image_variants.values():
+            default_storage.delete(path)
+        self.proguide.image.delete()
+
+    def _upload(self, size=(2000, 1000)):
+        """upload a jpeg of the given size to the proguide"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', size).save(image_file, format='JPEG')
+            image_file.seek(0)
+            return self.client.post(
+                image_upload_url(self.proguide.id),
+                {'image': image_file},
+                format='multipart',
+            )
+
+    def _run_worker(self):
+        call_command('process_image_jobs', '--once', stdout=StringIO())
+
+    def test_upload_queues_job(self):
+        """test uploading returns at once and queues a pending job"""
+        result = self._upload()
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['image_variants'], {})
+        job = ProGuideImageJob.objects.get(proguide=self.proguide)
+        self.assertEqual(job.status, ProGuideImageJob.PENDING)
+
+    def test_worker_generates_variants(self):
+        """test the worker writes resized variants and records them"""
+        self._upload()
+
+        self._run_worker()
+
+        self.proguide.refresh_from_db()
+        job = ProGuideImageJob.objects.get(proguide=self.proguide)
+        self.assertEqual(job.status, ProGuideImageJob.DONE)
+        self.assertEqual(
+            set(self.proguide.image_variants), set(images.VARIANTS))
+        for name, (width, height, quality) in images.VARIANTS.items():
+            with default_storage.open(
+                    self.proguide.image_variants[name]) as variant_file:
+                with Image.open(variant_file) as variant:
+                    self.assertLessEqual(variant.width, width)
+                    self.assertLessEqual(variant.height, height)
+
+        result = self.client.get(detail_url(self.proguide.id))
+        self.assertEqual(
+            set(result.data['image_variants']), set(images.VARIANTS))
+        self.assertTrue(
+            result.data['image_variants']['thumbnail'].startswith('http'))
+
+    def test_broken_image_job_fails(self):
+        """test a job whose image can't be read ends up failed"""
+        job = ProGuideImageJob.objects.create(
+            proguide=self.proguide, image='uploads/proguide/missing.jpg',
+        )
+
+        self._run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProGuideImageJob.FAILED)
+        self.assertEqual(job.attempts, images.MAX_ATTEMPTS)
+        self.assertNotEqual(job.error, '')
+
+    def test_replaced_image_job_discarded(self):
+        """test variants of an image replaced meanwhile are not recorded"""
+        self._upload()
+        job = ProGuideImageJob.objects.get(proguide=self.proguide)
+        ProGuide.objects.filter(pk=self.proguide.pk).update(
+            image='uploads/proguide/new.jpg')
+
+        self._run_worker()
+
+        self.proguide.refresh_from_db()
+        self.assertEqual(self.proguide.image_variants, {})
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProGuideImageJob.DONE)
+        default_storage.delete(job.image)
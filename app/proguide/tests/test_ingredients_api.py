@@ -2,6 +2,8 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -151,3 +153,43 @@ class PrivateIngredientsApiTests(TestCase):
         result = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(result.data), 1)
+
+    def test_ingredients_usage_count(self):
+        """test usage_count=1 adds the number of proguides using each"""
+        used = Ingredient.objects.create(user=self.user, name='salt')
+        unused = Ingredient.objects.create(user=self.user, name='pepper')
+        for i in range(2):
+            ProGuide.objects.create(
+                title=f'proguide {i}',
+                time_minutes=4,
+                price=Decimal('43.23'),
+                user=self.user,
+            ).ingredients.add(used)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(
+                INGREDIENTS_URL, {'usage_count': 1, 'assigned_only': 0})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        counts = {item['id']: item['usage_count'] for item in result.data}
+        self.assertEqual(counts, {used.id: 2, unused.id: 0})
+
+    def test_assigned_only_with_usage_count(self):
+        """test both flags combine into a unique counted list"""
+        used = Ingredient.objects.create(user=self.user, name='salt')
+        Ingredient.objects.create(user=self.user, name='pepper')
+        for i in range(2):
+            ProGuide.objects.create(
+                title=f'proguide {i}',
+                time_minutes=4,
+                price=Decimal('43.23'),
+                user=self.user,
+            ).ingredients.add(used)
+
+        result = self.client.get(
+            INGREDIENTS_URL, {'usage_count': 1, 'assigned_only': 1})
+
+        self.assertEqual(result.data, [
+            {'id': used.id, 'name': 'salt', 'usage_count': 2},
+        ])
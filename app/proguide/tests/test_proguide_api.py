@@ -1,6 +1,8 @@
 """tests for proguide apis"""
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -8,10 +10,16 @@ from rest_framework.test import APIClient
 
 from PIL import Image
 from decimal import Decimal
+from unittest.mock import patch
 import tempfile
+import struct
+import zlib
+import io
 import os
 
 from core.models import ProGuide, Tag, Ingredient
+from core.tests.query_budget import QueryBudgetMixin
+from proguide.pagination import ProGuideCursorPagination
 from proguide.serializers import ProGuideSerializer, ProGuideDetailSerializer
 
 
@@ -83,7 +91,7 @@ class PrivateProGuideApiTest(TestCase):
         serializer = ProGuideSerializer(proguides, many=True)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
 
     def test_proguide_list_limited_to_user(self):
         """test list of proguide is limited to authenticated user"""
@@ -100,7 +108,7 @@ class PrivateProGuideApiTest(TestCase):
         serializer = ProGuideSerializer(proguides, many=True)
 
         self.assertEqual(result.status_code, status.HTTP_200_OK)
-        self.assertEqual(result.data, serializer.data)
+        self.assertEqual(result.data['results'], serializer.data)
 
     def test_get_proguide_detail(self):
         """test get proguide detail"""
@@ -264,6 +272,105 @@ class PrivateProGuideApiTest(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_proguide_with_repeated_tag_names(self):
+        """test repeated names in payload create and link a single tag"""
+        payload = {
+            'title': 'object num1',
+            'time_minutes': 30,
+            'price': Decimal('3.41'),
+            'tags': [{'name': 'pen'}, {'name': 'pen'}],
+        }
+        result = self.client.post(PROGUIDES_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        proguide = ProGuide.objects.get(id=result.data['id'])
+        self.assertEqual(proguide.tags.count(), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_create_proguide_reuses_tags_ignoring_case(self):
+        """test names differing only in case resolve to a single tag"""
+        tag = Tag.objects.create(user=self.user, name='Pen')
+        payload = {
+            'title': 'object num1',
+            'time_minutes': 30,
+            'price': Decimal('3.41'),
+            'tags': [{'name': 'pen'}, {'name': 'PEN'}, {'name': 'book'}],
+        }
+        result = self.client.post(PROGUIDES_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        proguide = ProGuide.objects.get(id=result.data['id'])
+        self.assertIn(tag, proguide.tags.all())
+        self.assertEqual(proguide.tags.count(), 2)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_proguide_non_ascii_tags(self):
+        """test names the database lowers unlike python are resolved"""
+        for _ in range(2):
+            payload = {
+                'title': 'object num1',
+                'time_minutes': 30,
+                'price': Decimal('3.41'),
+                'tags': [{'name': 'Äpfel'}, {'name': 'İstanbul'}],
+                'ingredients': [{'name': 'İstanbul'}],
+            }
+            result = self.client.post(PROGUIDES_URL, payload, format='json')
+
+            self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(
+                sorted(tag['name'] for tag in result.data['tags']),
+                ['Äpfel', 'İstanbul'])
+        # the second proguide reused the tags
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_proguide_tag_created_concurrently(self):
+        """test a tag inserted by another request meanwhile is reused"""
+        original = ProGuideSerializer._attrs_by_name
+        calls = []
+
+        def racing_attrs_by_name(serializer, model, user, keys):
+            calls.append(keys)
+            if len(calls) == 1:
+                # another request creates the tag right after our lookup
+                model.objects.create(user=user, name='pen')
+                return {}
+            return original(serializer, model, user, keys)
+
+        payload = {
+            'title': 'object num1',
+            'time_minutes': 30,
+            'price': Decimal('3.41'),
+            'tags': [{'name': 'Pen'}],
+        }
+        with patch.object(ProGuideSerializer, '_attrs_by_name',
+                          racing_attrs_by_name):
+            result = self.client.post(PROGUIDES_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        tags = Tag.objects.filter(user=self.user)
+        self.assertEqual([tag.name for tag in tags], ['pen'])
+        proguide = ProGuide.objects.get(id=result.data['id'])
+        self.assertEqual(list(proguide.tags.all()), list(tags))
+
+    def test_create_proguide_ignores_other_users_tags(self):
+        """test tags of another user with the same name are not reused"""
+        other_user = create_user(
+            email='hameddjf01@gmail.com', password='12345678')
+        other_tag = Tag.objects.create(user=other_user, name='pen')
+        payload = {
+            'title': 'object num1',
+            'time_minutes': 30,
+            'price': Decimal('3.41'),
+            'tags': [{'name': 'pen'}],
+        }
+        result = self.client.post(PROGUIDES_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        proguide = ProGuide.objects.get(id=result.data['id'])
+        self.assertNotIn(other_tag, proguide.tags.all())
+        self.assertTrue(
+            proguide.tags.filter(user=self.user, name='pen').exists())
+
     def test_create_tag_on_update(self):
         """test creating tag when updating a proguide"""
         proguide = create_proguide(user=self.user)
@@ -299,6 +406,51 @@ class PrivateProGuideApiTest(TestCase):
         self.assertIn(tag_you, proguide.tags.all())
         self.assertNotIn(tag_me, proguide.tags.all())
 
+    def test_update_same_tags_writes_no_through_rows(self):
+        """test a no-op tags patch issues no m2m writes"""
+        proguide = create_proguide(user=self.user)
+        for name in ['pen', 'pencil']:
+            proguide.tags.add(Tag.objects.create(user=self.user, name=name))
+        payload = {'tags': [{'name': 'pen'}, {'name': 'pencil'}]}
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.patch(
+                detail_url(proguide.id), payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if 'core_proguide_tags' in query['sql']
+            and query['sql'].startswith(('INSERT', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+
+    def test_update_one_tag_touches_only_changed_rows(self):
+        """test swapping one tag deletes and inserts a single row each"""
+        proguide = create_proguide(user=self.user)
+        for name in ['pen', 'pencil', 'paper']:
+            proguide.tags.add(Tag.objects.create(user=self.user, name=name))
+        payload = {'tags': [{'name': 'pen'}, {'name': 'pencil'},
+                            {'name': 'book'}]}
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.patch(
+                detail_url(proguide.id), payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        through_sql = [
+            query['sql'] for query in context.captured_queries
+            if 'core_proguide_tags' in query['sql']
+        ]
+        deletes = [sql for sql in through_sql if sql.startswith('DELETE')]
+        inserts = [sql for sql in through_sql if sql.startswith('INSERT')]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            set(proguide.tags.values_list('name', flat=True)),
+            {'pen', 'pencil', 'book'},
+        )
+
     def test_clear_proguide_tags(self):
         """test clearing a proguides tags"""
         tag = Tag.objects.create(user=self.user, name='hameddjf33')
@@ -424,9 +576,27 @@ class PrivateProGuideApiTest(TestCase):
         s2 = ProGuideSerializer(p2)
         s3 = ProGuideSerializer(p3)
 
-        self.assertIn(s1.data, result.data)
-        self.assertIn(s2.data, result.data)
-        self.assertNotIn(s3.data, result.data)
+        self.assertIn(s1.data, result.data['results'])
+        self.assertIn(s2.data, result.data['results'])
+        self.assertNotIn(s3.data, result.data['results'])
+
+    def test_filter_by_many_tags_returns_unique_proguides(self):
+        """test a proguide matching several filter tags is listed once"""
+        proguide = create_proguide(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='pen')
+        tag2 = Tag.objects.create(user=self.user, name='pencil')
+        ingredient = Ingredient.objects.create(user=self.user, name='book')
+        proguide.tags.add(tag1, tag2)
+        proguide.ingredients.add(ingredient)
+
+        params = {
+            'tags': f'{tag1.id},{tag2.id}',
+            'ingredients': f'{ingredient.id}',
+        }
+        result = self.client.get(PROGUIDES_URL, params)
+
+        ids = [item['id'] for item in result.data['results']]
+        self.assertEqual(ids, [proguide.id])
 
     def test_filter_by_ingredients(self):
         """test filtering proguide by ingredients"""
@@ -446,9 +616,164 @@ class PrivateProGuideApiTest(TestCase):
         s2 = ProGuideSerializer(p2)
         s3 = ProGuideSerializer(p3)
 
-        self.assertIn(s1.data, result.data)
-        self.assertIn(s2.data, result.data)
-        self.assertNotIn(s3.data, result.data)
+        self.assertIn(s1.data, result.data['results'])
+        self.assertIn(s2.data, result.data['results'])
+        self.assertNotIn(s3.data, result.data['results'])
+
+
+class ProGuidePaginationTests(TestCase):
+    """test cursor pagination of the proguide list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='hameddjf33@gmail.com', password='12345678')
+        self.client.force_authenticate(self.user)
+
+    def _collect_ids(self, params):
+        """follow next cursors and return all listed proguide ids"""
+        ids = []
+        result = self.client.get(PROGUIDES_URL, params)
+        while True:
+            self.assertEqual(result.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(
+                len(result.data['results']), params['page_size'])
+            ids.extend(item['id'] for item in result.data['results'])
+            if not result.data['next']:
+                return ids
+            result = self.client.get(result.data['next'])
+
+    def test_pages_follow_cursor_in_id_order(self):
+        """test walking the cursor returns every proguide once, newest first"""
+        proguides = [create_proguide(user=self.user) for _ in range(5)]
+
+        ids = self._collect_ids({'page_size': 2})
+
+        expected = sorted((p.id for p in proguides), reverse=True)
+        self.assertEqual(ids, expected)
+
+    def test_cursor_with_tag_filter(self):
+        """test pagination keeps the tags filter across pages"""
+        tag = Tag.objects.create(user=self.user, name='pen')
+        tagged = []
+        for i in range(5):
+            proguide = create_proguide(user=self.user)
+            if i % 2 == 0:
+                proguide.tags.add(tag)
+                tagged.append(proguide.id)
+
+        ids = self._collect_ids({'page_size': 1, 'tags': str(tag.id)})
+
+        self.assertEqual(ids, sorted(tagged, reverse=True))
+
+    def test_page_size_is_bounded(self):
+        """test requesting a huge page is capped to the max page size"""
+        for _ in range(3):
+            create_proguide(user=self.user)
+
+        with patch.object(ProGuideCursorPagination, 'max_page_size', 2):
+            result = self.client.get(PROGUIDES_URL, {'page_size': 100000})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(result.data['results']), 2)
+        self.assertIsNotNone(result.data['next'])
+
+
+class ProGuideQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """test proguide endpoints run a fixed number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='hameddjf33@gmail.com', password='12345678')
+        self.client.force_authenticate(self.user)
+
+    def _create_proguides(self, count):
+        """create proguides with a tag and an ingredient each"""
+        for i in range(count):
+            proguide = create_proguide(user=self.user, title=f'object {i}')
+            # names are unique per user, later calls reuse them
+            proguide.tags.add(Tag.objects.get_or_create(
+                user=self.user, name=f'tag {i}')[0])
+            proguide.ingredients.add(Ingredient.objects.get_or_create(
+                user=self.user, name=f'ing {i}')[0])
+
+    def test_list_query_budget_independent_of_size(self):
+        """test listing proguides does not grow queries with rows"""
+        self._create_proguides(1)
+        with self.assertQueryBudget('proguide:proguide-list') as small:
+            self.client.get(PROGUIDES_URL)
+
+        self._create_proguides(10)
+        with self.assertQueryBudget('proguide:proguide-list') as large:
+            result = self.client.get(PROGUIDES_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(small), len(large))
+
+    def test_filtered_list_query_budget(self):
+        """test filtering proguides stays inside the list budget"""
+        self._create_proguides(5)
+        tag_ids = ','.join(str(tag.id) for tag in Tag.objects.all())
+
+        with self.assertQueryBudget('proguide:proguide-list'):
+            result = self.client.get(PROGUIDES_URL, {'tags': tag_ids})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
+    def test_detail_query_budget(self):
+        """test retrieving a proguide stays inside its budget"""
+        self._create_proguides(1)
+        proguide = ProGuide.objects.get(user=self.user)
+
+        with self.assertQueryBudget('proguide:proguide-detail'):
+            result = self.client.get(detail_url(proguide.id))
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
+    def test_create_query_budget(self):
+        """test creating a proguide with many new tags stays inside budget"""
+        Tag.objects.create(user=self.user, name='tag 0')
+        payload = {
+            'title': 'object num1',
+            'time_minutes': 30,
+            'price': Decimal('3.41'),
+            'tags': [{'name': f'tag {i}'} for i in range(30)],
+            'ingredients': [{'name': f'ing {i}'} for i in range(40)],
+        }
+
+        with self.assertQueryBudget('proguide:proguide-list', 'POST'):
+            result = self.client.post(PROGUIDES_URL, payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_201_CREATED)
+        proguide = ProGuide.objects.get(id=result.data['id'])
+        self.assertEqual(proguide.tags.count(), 30)
+        self.assertEqual(proguide.ingredients.count(), 40)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 30)
+
+    def test_update_query_budget(self):
+        """test updating a proguide stays inside its budget"""
+        self._create_proguides(1)
+        proguide = ProGuide.objects.get(user=self.user)
+
+        with self.assertQueryBudget('proguide:proguide-detail', 'PATCH'):
+            result = self.client.patch(
+                detail_url(proguide.id), {'title': 'new title'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
+    def test_update_tags_query_budget(self):
+        """test replacing many tags stays inside the update budget"""
+        self._create_proguides(1)
+        proguide = ProGuide.objects.get(user=self.user)
+        payload = {'tags': [{'name': f'new tag {i}'} for i in range(30)]}
+
+        with self.assertQueryBudget('proguide:proguide-detail', 'PATCH'):
+            result = self.client.patch(
+                detail_url(proguide.id), payload, format='json')
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(proguide.tags.count(), 30)
 
 
 class ImageUploadTests(TestCase):
@@ -493,6 +818,19 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', result.data)
         self.assertTrue(os.path.exists(self.proguide.image.path))
 
+    def test_image_read_only_on_update(self):
+        """test images are only written through upload-image"""
+        with tempfile.NamedTemporaryFile(suffix='.gif') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='GIF')
+            image_file.seek(0)
+            result = self.client.patch(
+                detail_url(self.proguide.id), {'image': image_file},
+                format='multipart')
+
+        self.proguide.refresh_from_db()
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertFalse(self.proguide.image)
+
     def test_upload_image_bad_request(self):
         """test uploading invalid image"""
         url = image_upload_url(self.proguide.id)
@@ -500,3 +838,67 @@ class ImageUploadTests(TestCase):
         result = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PROGUIDE_IMAGE_LIMITS={
+        'MAX_BYTES': 10485760, 'MAX_PIXELS': 100, 'FORMATS': ['JPEG'],
+    })
+    def test_upload_image_too_many_pixels(self):
+        """test an image above the pixel limit is rejected"""
+        url = image_upload_url(self.proguide.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (20, 20)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            result = self.client.post(
+                url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', result.data)
+        self.proguide.refresh_from_db()
+        self.assertFalse(self.proguide.image)
+
+    @override_settings(PROGUIDE_IMAGE_LIMITS={
+        'MAX_BYTES': 10485760, 'MAX_PIXELS': 1000, 'FORMATS': ['JPEG'],
+    })
+    def test_upload_image_unsupported_format(self):
+        """test an image in a format outside the allowed list is rejected"""
+        url = image_upload_url(self.proguide.id)
+        with tempfile.NamedTemporaryFile(suffix='.gif') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='GIF')
+            image_file.seek(0)
+            result = self.client.post(
+                url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PROGUIDE_IMAGE_LIMITS={
+        'MAX_BYTES': 100, 'MAX_PIXELS': 1000000, 'FORMATS': ['JPEG'],
+    })
+    def test_upload_image_too_large(self):
+        """test a file above the byte limit is rejected"""
+        url = image_upload_url(self.proguide.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (100, 100)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            result = self.client.post(
+                url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_decompression_bomb_rejected(self):
+        """test a png whose header claims huge dimensions is rejected"""
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(buffer, format='PNG')
+        data = bytearray(buffer.getvalue())
+        # rewrite the IHDR width/height (and its crc) to 100000 x 100000
+        data[16:24] = struct.pack('>II', 100000, 100000)
+        data[29:33] = struct.pack('>I', zlib.crc32(bytes(data[12:29])))
+
+        url = image_upload_url(self.proguide.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            image_file.write(bytes(data))
+            image_file.seek(0)
+            result = self.client.post(
+                url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', result.data)
@@ -0,0 +1,87 @@
+"""tests for reading the proguide apis from the replica database"""
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ProGuide, Tag
+
+PROGUIDES_URL = reverse('proguide:proguide-list')
+TAGS_URL = reverse('proguide:tag-list')
+
+
+def detail_url(proguide_id):
+    """create and return a proguide detail url"""
+    return reverse('proguide:proguide-detail', args=[proguide_id])
+
+
+@skipUnless('replica' in settings.DATABASES,
+            'set DB_REPLICA_HOST to test the replica')
+class ReplicaReadsTests(TransactionTestCase):
+    """test which database the proguide apis use"""
+    databases = '__all__'
+
+    def setUp(self):
+        caches[settings.PROGUIDE_CACHE['ALIAS']].clear()
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com',
+            '12345678',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.proguide = ProGuide.objects.create(
+            user=self.user,
+            title='object num1',
+            time_minutes=22,
+            price=Decimal('1.11'),
+        )
+        self.proguide.tags.add(Tag.objects.create(user=self.user, name='pen'))
+
+    def _queries(self, method, url, data=None):
+        """send a request, return it and the queries run per database"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            res = getattr(self.client, method)(url, data, format='json')
+        return res, len(primary), len(replica)
+
+    def test_reads_from_replica(self):
+        """test safe requests read from the replica only"""
+        for url in (PROGUIDES_URL, detail_url(self.proguide.id), TAGS_URL):
+            res, primary, replica = self._queries('get', url)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(primary, 0)
+            self.assertGreater(replica, 0)
+
+    def test_writes_on_primary(self):
+        """test a write and the reads of its request use the primary"""
+        payload = {'title': 'new', 'time_minutes': 5,
+                   'price': '2.50', 'tags': [{'name': 'pen'}]}
+
+        res, primary, replica = self._queries('post', PROGUIDES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['tags'][0]['name'], 'pen')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_reads_after_write_stay_on_primary(self):
+        """test the user reads from the primary right after a write"""
+        self.client.patch(detail_url(self.proguide.id), {'title': 'new'},
+                          format='json')
+
+        res, primary, replica = self._queries(
+            'get', detail_url(self.proguide.id))
+
+        self.assertEqual(res.data['title'], 'new')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
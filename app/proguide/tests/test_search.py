@@ -0,0 +1,138 @@
+"""tests for searching proguides"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from core.models import ProGuide, Tag
+from proguide.views import ProGuideViewSet
+
+
+PROGUIDES_URL = reverse('proguide:proguide-list')
+
+
+def create_proguide(user, **params):
+    """create and return a sample proguide"""
+    defaults = {
+        'title': 'object num1',
+        'time_minutes': 22,
+        'price': Decimal('1.11'),
+    }
+    defaults.update(params)
+    return ProGuide.objects.create(user=user, **defaults)
+
+
+class ProGuideSearchTests(TestCase):
+    """test the search query parameter of the proguide list"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'hameddjf33@gmail.com',
+            '12345678',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _search(self, search, **params):
+        result = self.client.get(PROGUIDES_URL, {'search': search, **params})
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        return result.data
+
+    def _titles(self, data):
+        return [item['title'] for item in data['results']]
+
+    def test_search_title_and_description(self):
+        """test matches in title or description are returned"""
+        create_proguide(self.user, title='python basics')
+        create_proguide(self.user, title='cooking',
+                        description='learn python by cooking')
+        create_proguide(self.user, title='django')
+
+        data = self._search('python')
+
+        self.assertEqual(
+            set(self._titles(data)), {'python basics', 'cooking'})
+
+    def test_search_every_word_must_match(self):
+        """test a multi word search matches proguides with all words"""
+        create_proguide(self.user, title='python basics')
+        create_proguide(self.user, title='python advanced')
+
+        data = self._search('python advanced')
+
+        self.assertEqual(self._titles(data), ['python advanced'])
+
+    def test_search_ranks_title_matches_first(self):
+        """test a title match ranks above a description match"""
+        create_proguide(self.user, title='python basics')
+        create_proguide(self.user, title='cooking',
+                        description='learn python by cooking')
+
+        data = self._search('python')
+
+        self.assertEqual(self._titles(data), ['python basics', 'cooking'])
+
+    def test_search_limited_to_user(self):
+        """test other users' proguides never match"""
+        other = get_user_model().objects.create_user(
+            'hameddjf01@gmail.com', '12345678')
+        create_proguide(other, title='python')
+        create_proguide(self.user, title='python')
+
+        data = self._search('python')
+
+        self.assertEqual(len(data['results']), 1)
+
+    def test_search_with_tag_filter(self):
+        """test search combines with the tag filter"""
+        tag = Tag.objects.create(user=self.user, name='tutorial')
+        tagged = create_proguide(self.user, title='python tagged')
+        tagged.tags.add(tag)
+        create_proguide(self.user, title='python untagged')
+
+        data = self._search('python', tags=str(tag.id))
+
+        self.assertEqual(self._titles(data), ['python tagged'])
+
+    def test_search_pages_follow_rank(self):
+        """test cursor pages of a search cover every match once"""
+        for i in range(5):
+            create_proguide(self.user, title=f'python {i}')
+        for i in range(5):
+            create_proguide(self.user, title=f'other {i}',
+                            description='python')
+
+        titles = []
+        data = self._search('python', page_size=3)
+        titles.extend(self._titles(data))
+        while data['next']:
+            data = self.client.get(data['next']).data
+            titles.extend(self._titles(data))
+
+        self.assertEqual(len(titles), 10)
+        self.assertEqual(len(set(titles)), 10)
+        self.assertTrue(all(t.startswith('python') for t in titles[:5]))
+
+    def test_search_regular_list_path(self):
+        """test the search works when listing through the serializer"""
+        create_proguide(self.user, title='python basics')
+        create_proguide(self.user, title='django')
+
+        with patch.object(ProGuideViewSet, 'fast_list', False):
+            data = self._search('python')
+
+        self.assertEqual(self._titles(data), ['python basics'])
+
+    def test_blank_search_lists_everything(self):
+        """test an empty search parameter is ignored"""
+        create_proguide(self.user, title='python basics')
+        create_proguide(self.user, title='django')
+
+        data = self._search(' ')
+
+        self.assertEqual(len(data['results']), 2)
@@ -2,6 +2,8 @@
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -85,6 +87,25 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_to_existing_name_error(self):
+        """test renaming a tag to a name the user has returns an error"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='quick')
+
+        result = self.client.patch(detail_url(tag.id), {'name': 'vegan'})
+
+        self.assertEqual(result.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'quick')
+
+    def test_update_tag_name_case(self):
+        """test a tag can change the case of its own name"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+
+        result = self.client.patch(detail_url(tag.id), {'name': 'Vegan'})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+
     def test_deleting_tag(self):
         """test deleting a tag"""
         tag = Tag.objects.create(user=self.user, name='hameddjf03')
@@ -138,3 +159,43 @@ class PrivateTagsApiTests(TestCase):
         result = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(result.data), 1)
+
+    def test_tags_usage_count(self):
+        """test usage_count=1 adds the number of proguides using each"""
+        used = Tag.objects.create(user=self.user, name='vegan')
+        unused = Tag.objects.create(user=self.user, name='quick')
+        for i in range(2):
+            ProGuide.objects.create(
+                title=f'proguide {i}',
+                time_minutes=4,
+                price=Decimal('43.23'),
+                user=self.user,
+            ).tags.add(used)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.client.get(
+                TAGS_URL, {'usage_count': 1, 'assigned_only': 0})
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        counts = {item['id']: item['usage_count'] for item in result.data}
+        self.assertEqual(counts, {used.id: 2, unused.id: 0})
+
+    def test_assigned_only_with_usage_count(self):
+        """test both flags combine into a unique counted list"""
+        used = Tag.objects.create(user=self.user, name='vegan')
+        Tag.objects.create(user=self.user, name='quick')
+        for i in range(2):
+            ProGuide.objects.create(
+                title=f'proguide {i}',
+                time_minutes=4,
+                price=Decimal('43.23'),
+                user=self.user,
+            ).tags.add(used)
+
+        result = self.client.get(
+            TAGS_URL, {'usage_count': 1, 'assigned_only': 1})
+
+        self.assertEqual(result.data, [
+            {'id': used.id, 'name': 'vegan', 'usage_count': 2},
+        ])
@@ -1,4 +1,9 @@
 """views for the proguide apis"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -7,45 +12,107 @@ from drf_spectacular.utils import (
 )
 
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from core.models import ProGuide, Tag, Ingredient
+from user.authentication import CachedTokenAuthentication
+from proguide import images
+from proguide.cache import (
+    CachedListMixin,
+    caching_enabled,
+    deferred_invalidation,
+    get_cache,
+    response_cache_key,
+)
+from proguide.conditional import ConditionalGetMixin
+from proguide.facets import facet_counts
+from proguide.pagination import ProGuideCursorPagination
+from proguide.replica import ReplicaReadMixin
+from proguide.search import search_proguides
 from proguide.serializers import (
     ProGuideSerializer,
+    ProGuideRowsSerializer,
     ProGuideDetailSerializer,
     TagSerializer,
+    TagUsageSerializer,
     IngredientSerializer,
+    IngredientUsageSerializer,
     ProGuideImageSerializer,
+    ProGuideBulkDeleteSerializer,
+    ProGuideBulkDeleteResultSerializer,
+    ProGuideFacetsSerializer,
+    nested_prefetches,
 )
 
 
+class RowsListMixin:
+    """
+    serve the list action from `values()` rows through
+    ProGuideRowsSerializer, skipping model instances and per-field
+    serializers. the output is the same as the regular list.
+    """
+    # set to False to list through the regular serializer
+    fast_list = True
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # annotations (search_rank) are kept for the cursor position
+        rows = queryset.prefetch_related(None).values(
+            *ProGuideRowsSerializer.ROW_FIELDS, *queryset.query.annotations)
+        page = self.paginate_queryset(rows)
+        serializer = ProGuideRowsSerializer(
+            rows if page is None else page,
+            context=self.get_serializer_context(),
+        )
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+
+# query parameters filtering the proguide list (and its facets)
+FILTER_PARAMETERS = [
+    # جدا شده توسط ویرگول ID هایبرای فیلتر کردن با 'tags' تعریف پارامتر
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='فهرست شناسه‌ها برای فیلتر کردن با , جدا شده'
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='لیستی از شناسه‌های عناصر برا فیلتر با , جدا شده'
+    ),
+    OpenApiParameter(
+        'search',
+        OpenApiTypes.STR,
+        description='جستجو در عنوان و توضیحات، نتایج بر اساس رتبه'
+    ),
+]
+
+
 # DRF در ویوهای  OpenAPI دکوریتوری برای افزودن یا تغییر مستندات
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
-            # جدا شده توسط ویرگول ID هایبرای فیلتر کردن با 'tags' تعریف پارامتر
-            OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='فهرست شناسه‌ها برای فیلتر کردن با , جدا شده'
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='لیستی از شناسه‌های عناصر برا فیلتر با , جدا شده'
-            )
-        ]
-    )
+    list=extend_schema(parameters=FILTER_PARAMETERS)
 )
-class ProGuideViewSet(viewsets.ModelViewSet):
+class ProGuideViewSet(ReplicaReadMixin,
+                      ConditionalGetMixin,
+                      CachedListMixin,
+                      RowsListMixin,
+                      viewsets.ModelViewSet):
     """view for manage proguide apis"""
     serializer_class = ProGuideDetailSerializer
     queryset = ProGuide.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = ProGuideCursorPagination
+    # upper bound of items accepted by the bulk endpoint
+    bulk_max_items = 5000
 
     def _params_to_ints(self, qs):
         """convert a list of strings to integers(like:'1,2,3')"""
@@ -56,23 +123,42 @@ class ProGuideViewSet(viewsets.ModelViewSet):
         # تبدیل پارامترهای دریافتی از کوئری استرینگ به صحیح (مانند: '1,2,3')
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
+        search = self.request.query_params.get('search', '').strip()
+        # fetch user and nested relations up front (avoid n+1 in serializer)
+        queryset = self.queryset.select_related('user').prefetch_related(
+            *nested_prefetches()
+        ).defer('search_vector')
         if tags:
             """
             QuerySet به اعداد صحیح و فیلتر کردن  tags تبدیل مقادیر
             بر اساس شناسه‌های tags"""
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(Exists(
+                ProGuide.tags.through.objects.filter(
+                    proguide_id=OuterRef('pk'), tag_id__in=tag_ids,
+                )
+            ))
         if ingredients:
             """
             QuerySet به اعداد صحیح و فیلتر کردن  ingredients تبدیل مقادیر
             بر اساس شناسه‌های ingredients"""
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(Exists(
+                ProGuide.ingredients.through.objects.filter(
+                    proguide_id=OuterRef('pk'),
+                    ingredient_id__in=ingredient_ids,
+                )
+            ))
         # برای بازگرداندن موارد مرتبط با کاربر جاری، QuerySet فیلتر کننده نهایی
-        return queryset.filter(
+        # semi-joins never duplicate rows, so no distinct() is needed
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).order_by('-id')
+        if search:
+            # best matches first, see ProGuideCursorPagination
+            queryset = search_proguides(queryset, search).order_by(
+                '-search_rank', '-id')
+        return queryset
 
     def get_serializer_class(self):
         """return the serializer class for request"""
@@ -81,6 +167,10 @@ class ProGuideViewSet(viewsets.ModelViewSet):
             return ProGuideSerializer
         elif self.action == 'upload_image':
             return ProGuideImageSerializer
+        elif self.action == 'bulk' and self.request.method == 'DELETE':
+            return ProGuideBulkDeleteSerializer
+        elif self.action == 'facets':
+            return ProGuideFacetsSerializer
 
         return self.serializer_class
 
@@ -89,6 +179,115 @@ class ProGuideViewSet(viewsets.ModelViewSet):
         """Saves a new proguide linked to the current user."""
         serializer.save(user=self.request.user)
 
+    def _bulk_items(self, request):
+        """return the request body as a list of items, or an error"""
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError(
+                {'non_field_errors': ['expected a non-empty list of items']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'non_field_errors': [
+                f'at most {self.bulk_max_items} items per request']})
+        return items
+
+    def _bulk_instances(self, items):
+        """return the user's proguides for the item ids, in item order"""
+        ids = []
+        for item in items:
+            try:
+                ids.append(int(item['id']))
+            except (TypeError, KeyError, ValueError):
+                ids.append(None)
+        proguides = self.get_queryset().in_bulk(
+            [pk for pk in ids if pk is not None])
+
+        errors = []
+        seen = set()
+        for pk in ids:
+            if pk is None:
+                errors.append({'id': ['this field is required.']})
+            elif pk not in proguides:
+                errors.append({'id': ['not found.']})
+            elif pk in seen:
+                errors.append({'id': ['duplicated in request.']})
+            else:
+                errors.append({})
+            seen.add(pk)
+        if any(errors):
+            raise ValidationError(errors)
+        return [proguides[pk] for pk in ids]
+
+    @extend_schema(
+        methods=['POST', 'PATCH'],
+        request=ProGuideDetailSerializer(many=True),
+        responses=ProGuideDetailSerializer(many=True),
+    )
+    @extend_schema(
+        methods=['DELETE'],
+        request=ProGuideBulkDeleteSerializer,
+        responses=ProGuideBulkDeleteResultSerializer(many=True),
+    )
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False,
+            url_path='bulk')
+    def bulk(self, request):
+        """
+        create (POST), update (PATCH, items carry their id) or delete
+        (DELETE, {"ids": [...]}) many proguides in one transaction.
+        results are returned per item, in request order.
+        """
+        if request.method == 'DELETE':
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            ids = serializer.validated_data['ids']
+            if len(ids) > self.bulk_max_items:
+                raise ValidationError({'ids': [
+                    f'at most {self.bulk_max_items} items per request']})
+
+            # one cache version bump, not one per deleted row
+            with transaction.atomic(), deferred_invalidation():
+                proguides = ProGuide.objects.filter(
+                    user=request.user, id__in=ids)
+                found = set(proguides.values_list('id', flat=True))
+                proguides.delete()
+            results = [
+                {'id': pk, 'status': 'deleted' if pk in found else
+                 'not_found'}
+                for pk in ids
+            ]
+            return Response(results, status=status.HTTP_200_OK)
+
+        items = self._bulk_items(request)
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=items, many=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save(user=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        serializer = self.get_serializer(
+            self._bulk_instances(items), data=items, many=True, partial=True,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(parameters=FILTER_PARAMETERS)
+    @action(methods=['GET'], detail=False, url_path='facets')
+    def facets(self, request):
+        """
+        number of proguides per tag and per ingredient, counted over the
+        list filtered by the same parameters. cached per user.
+        """
+        if not caching_enabled():
+            return Response(
+                facet_counts(self.filter_queryset(self.get_queryset())))
+        cache = get_cache()
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            data = facet_counts(self.filter_queryset(self.get_queryset()))
+            cache.set(key, data, settings.PROGUIDE_CACHE['TIMEOUT'])
+        return Response(data)
+
     """
     defines a custom action 'upload-image' for POST requests
     on a single resource in a ViewSet(specific id in proguide)"""
@@ -100,8 +299,10 @@ class ProGuideViewSet(viewsets.ModelViewSet):
 
         if serializer.is_valid():
             serializer.save()
+            # variants are generated by the process_image_jobs worker
+            images.enqueue(proguide)
             return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 # Filter items by proguide assignment.
@@ -112,44 +313,80 @@ class ProGuideViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='filter by items assigned to proguides',
-            )
+            ),
+            OpenApiParameter(
+                'usage_count',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='include the number of proguides using each item',
+            ),
         ]
     )
 )
-class BaseProGuideAttrViewSet(mixins.DestroyModelMixin,
+class BaseProGuideAttrViewSet(ReplicaReadMixin,
+                              CachedListMixin,
+                              mixins.DestroyModelMixin,
                               mixins.UpdateModelMixin,
                               mixins.ListModelMixin,
                               viewsets.GenericViewSet):
     """manage tags in the database"""
     # set authentication token to authentication_classes
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     # for using this endpoint user must be authenticated
     permission_classes = [IsAuthenticated]
 
+    def _flag(self, name):
+        return bool(int(self.request.query_params.get(name, 0)))
+
+    def _links(self):
+        """through table rows of the item in the outer query"""
+        field = ProGuide._meta.get_field(self.proguide_field)
+        column = f'{field.m2m_reverse_field_name()}_id'
+        return field.remote_field.through.objects.filter(
+            **{column: OuterRef('pk')}
+        ).order_by().values(column)
+
     def get_queryset(self):
         """filter queryset to authenticated user"""
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
         queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(proguide__isnull=False)
+        if self._flag('assigned_only'):
+            # semi-join, stops at the first link and never duplicates rows
+            queryset = queryset.filter(Exists(self._links()))
+        if self._flag('usage_count'):
+            # counted per item by a correlated subquery, no group by
+            queryset = queryset.annotate(usage_count=Coalesce(
+                Subquery(self._links().annotate(
+                    count=Count('*')).values('count')),
+                0,
+            ))
 
+        # (user, name) index scan
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by('-name')
+
+    def get_serializer_class(self):
+        """return the serializer class for request"""
+        if self.action == 'list' and self._flag('usage_count'):
+            return self.usage_serializer_class
+        return self.serializer_class
 
 
 class TagViewSet(BaseProGuideAttrViewSet):
     """manage tags in the database"""
 
     serializer_class = TagSerializer
+    usage_serializer_class = TagUsageSerializer
     queryset = Tag.objects.all()
+    # ProGuide relation the tags are linked through
+    proguide_field = 'tags'
 
 
 class IngredientViewSet(BaseProGuideAttrViewSet):
     """manage ingredients in the database"""
     # set the ingredientserializer to serializer_classes
     serializer_class = IngredientSerializer
+    usage_serializer_class = IngredientUsageSerializer
     # set all oobjects of ingredient model to queryset
     queryset = Ingredient.objects.all()
+    # ProGuide relation the ingredients are linked through
+    proguide_field = 'ingredients'
@@ -0,0 +1,169 @@
+"""
+authentication classes for the apis.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+SHARED_KEY_PREFIX = 'authtoken:'
+REVOKED_KEY_PREFIX = 'authtoken:revoked:'
+
+
+class TokenCache:
+    """bounded, thread safe lru of token key -> ((user, token), revision)"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """return the cached entry for key, or None if missing/expired"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            entry, expires = item
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """store entry, dropping the least recently used one when full"""
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """drop a single token"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        """drop every token resolving to user_id"""
+        with self._lock:
+            for key, (((user, _), _), _) in list(self._entries.items()):
+                if user.pk == user_id:
+                    del self._entries[key]
+
+    def clear(self):
+        """drop everything"""
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_AUTH_CACHE['MAX_SIZE'],
+    ttl=settings.TOKEN_AUTH_CACHE['TTL'],
+)
+
+
+def get_shared_cache():
+    """return the shared cache tier, or None when it is not configured"""
+    alias = settings.TOKEN_AUTH_CACHE['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def invalidate_tokens(keys):
+    """
+    remove token keys from the local and the shared cache, and mark them
+    revoked for the local caches of the other processes.
+    """
+    keys = list(keys)
+    for key in keys:
+        token_cache.delete(key)
+    shared = get_shared_cache()
+    if shared is not None and keys:
+        shared.delete_many([SHARED_KEY_PREFIX + key for key in keys])
+        # kept as long as a local entry cached before it can live
+        revision = time.time_ns()
+        shared.set_many(
+            {REVOKED_KEY_PREFIX + key: revision for key in keys},
+            settings.TOKEN_AUTH_CACHE['TTL'],
+        )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    token authentication that remembers token -> user resolutions.
+    lookups go through a per-process lru first, then the optional shared
+    cache, and only hit the database on a miss. entries are dropped when
+    a token is deleted or its user is saved (e.g. deactivated). with the
+    shared cache, a local hit also checks the revocation marker of the
+    token there; without it other processes drop their entries after
+    TOKEN_AUTH_CACHE['TTL'] seconds at most.
+    """
+
+    def authenticate_credentials(self, key):
+        shared = get_shared_cache()
+        cached = token_cache.get(key)
+        if cached is not None:
+            entry, revision = cached
+            if shared is not None and \
+                    shared.get(REVOKED_KEY_PREFIX + key) != revision:
+                cached = None
+        if cached is None:
+            entry = revision = None
+            if shared is not None:
+                # the marker is read first, a later revocation changes it
+                found = shared.get_many(
+                    [SHARED_KEY_PREFIX + key, REVOKED_KEY_PREFIX + key])
+                entry = found.get(SHARED_KEY_PREFIX + key)
+                revision = found.get(REVOKED_KEY_PREFIX + key)
+            if entry is None:
+                # raises AuthenticationFailed for unknown/inactive, uncached
+                entry = super().authenticate_credentials(key)
+                if shared is not None:
+                    shared.set(
+                        SHARED_KEY_PREFIX + key, entry,
+                        settings.TOKEN_AUTH_CACHE['TTL'],
+                    )
+            token_cache.set(key, (entry, revision))
+
+        user, token = entry
+        # every request gets its own user object, views may modify it
+        return copy.copy(user), token
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """forget a deleted token"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    """forget the tokens of a changed (e.g. deactivated) or deleted user"""
+    token_cache.delete_user(instance.pk)
+    if get_shared_cache() is not None:
+        invalidate_tokens(
+            Token.objects.filter(user_id=instance.pk)
+            .values_list('key', flat=True)
+        )
+
+
+@receiver(setting_changed)
+def token_auth_cache_changed(setting, **kwargs):
+    """follow override_settings(TOKEN_AUTH_CACHE=...) in tests and tools"""
+    if setting == 'TOKEN_AUTH_CACHE':
+        token_cache.max_size = settings.TOKEN_AUTH_CACHE['MAX_SIZE']
+        token_cache.ttl = settings.TOKEN_AUTH_CACHE['TTL']
+        token_cache.clear()
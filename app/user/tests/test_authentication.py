@@ -0,0 +1,155 @@
+"""
+tests for the cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import TokenCache, token_cache
+
+
+ME_URL = reverse('user:me_page')
+
+
+def create_user(**params):
+    """create and return a new user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class TokenCacheTests(TestCase):
+    """test the bounded lru token cache"""
+
+    def test_least_recently_used_entry_evicted(self):
+        """test the oldest entry is dropped once the cache is full"""
+        cache = TokenCache(max_size=2, ttl=60)
+        cache.set('a', 'user a')
+        cache.set('b', 'user b')
+        cache.get('a')
+        cache.set('c', 'user c')
+
+        self.assertEqual(cache.get('a'), 'user a')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'user c')
+
+    def test_expired_entry_dropped(self):
+        """test entries are not served after their ttl"""
+        cache = TokenCache(max_size=2, ttl=-1)
+        cache.set('a', 'user a')
+
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """test token authentication through the cache"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user(
+            email='hameddjf33@gmail.com',
+            password='12345678',
+            name='hamed',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_token_lookup_cached(self):
+        """test a repeated request does not query the token again"""
+        self.client.get(ME_URL)
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.get(ME_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(result.data['email'], self.user.email)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_deleted_token_rejected(self):
+        """test deleting a token invalidates the cached entry"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        result = self.client.get(ME_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """test deactivating a user invalidates the cached entry"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        result = self.client.get(ME_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_updated_user_not_stale(self):
+        """test updating the user through the api is seen afterwards"""
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'new name'})
+
+        result = self.client.get(ME_URL)
+
+        self.assertEqual(result.data['name'], 'new name')
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'tokens': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tokens',
+        },
+    }, TOKEN_AUTH_CACHE={
+        'MAX_SIZE': 1024, 'TTL': 60, 'SHARED_CACHE': 'tokens',
+    })
+    def test_shared_cache_tier(self):
+        """test a worker with an empty lru is served from the shared cache"""
+        self.client.get(ME_URL)
+        token_cache.clear()
+
+        with CaptureQueriesContext(connection) as context:
+            result = self.client.get(ME_URL)
+        self.assertEqual(result.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context.captured_queries), 0)
+
+        self.token.delete()
+        token_cache.clear()
+        result = self.client.get(ME_URL)
+        self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'tokens': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tokens',
+        },
+    }, TOKEN_AUTH_CACHE={
+        'MAX_SIZE': 1024, 'TTL': 60, 'SHARED_CACHE': 'tokens',
+    })
+    def test_revoked_in_other_process(self):
+        """test a local entry is not used once another worker revoked it"""
+        self.client.get(ME_URL)
+
+        # saved by another worker: only the shared cache is updated
+        with patch.object(token_cache, 'delete'), \
+                patch.object(token_cache, 'delete_user'):
+            self.user.is_active = False
+            self.user.save()
+
+        result = self.client.get(ME_URL)
+
+        self.assertEqual(result.status_code, status.HTTP_401_UNAUTHORIZED)
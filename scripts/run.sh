@@ -4,6 +4,17 @@ set -e
 
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
+# generated once per deploy, shared by every worker (app/schema.py)
+export SCHEMA_CACHE_DIR="${SCHEMA_CACHE_DIR:-/vol/web/schema}"
+python manage.py generate_schema
+# every worker writes its request metrics here, /api/metrics/ sums them
+# (core/metrics.py); the previous run's workers are gone
+export METRICS_DIR="${METRICS_DIR:-/tmp/app-metrics}"
+rm -rf "$METRICS_DIR"
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# the uwsgi master loads and warms up app.wsgi once (WSGI_WARMUP), the
+# workers are forked from it; it also keeps the image worker running
+export WSGI_WARMUP="${WSGI_WARMUP:-1}"
+uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi \
+    --attach-daemon "python manage.py process_image_jobs"
\ No newline at end of file
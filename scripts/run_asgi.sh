@@ -0,0 +1,33 @@
+#!/bin/sh
+
+# ASGI deployment mode: proguide, tag and ingredient reads are served by
+# async views (app/asgi_urls.py), so one worker keeps serving requests
+# while up to ASGI_READ_THREADS reads wait on a slow database.
+# speaks plain http on APP_PORT: the proxy has to use proxy_pass instead
+# of uwsgi_pass in this mode.
+# load test: python manage.py loadtest_asgi
+
+set -e
+
+# django runs the sync code of each ASGI request in a thread of its own, a
+# connection kept after the request would never be used again: they go
+# back to the worker's pool instead (core.backends.postgresql).
+export DB_CONN_MAX_AGE="${DB_CONN_MAX_AGE:-0}"
+export DB_POOL_MAX_SIZE="${DB_POOL_MAX_SIZE:-${ASGI_READ_THREADS:-32}}"
+
+python manage.py wait_for_db
+python manage.py collectstatic --noinput
+# generated once per deploy, shared by every worker (app/schema.py)
+export SCHEMA_CACHE_DIR="${SCHEMA_CACHE_DIR:-/vol/web/schema}"
+python manage.py generate_schema
+# every worker writes its request metrics here, /api/metrics/ sums them
+# (core/metrics.py); the previous run's workers are gone
+export METRICS_DIR="${METRICS_DIR:-/tmp/app-metrics}"
+rm -rf "$METRICS_DIR"
+python manage.py migrate
+
+# uvicorn has no attach-daemon, keep the image worker running next to it
+python manage.py process_image_jobs &
+
+exec uvicorn app.asgi:application --host 0.0.0.0 --port "${APP_PORT:-9000}" \
+    --workers "${ASGI_WORKERS:-4}"